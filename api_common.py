@@ -0,0 +1,72 @@
+"""
+Helpers shared by the Flask app variants
+orjson JSON provider, CORS headers and request parameter parsing, kept in one place so the apps don't drift apart
+"""
+
+try:
+    import orjson
+    from flask import current_app
+    from flask.json.provider import DefaultJSONProvider
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+if ORJSON_AVAILABLE:
+    class OrjsonProvider(DefaultJSONProvider):
+        """Serialize JSON responses with orjson instead of the stdlib encoder"""
+        
+        def encode(self, obj, indent=False, newline=False):
+            """orjson bytes for obj, sorted keys; indent pretty-prints with 2 spaces (all orjson offers)"""
+            option = orjson.OPT_SORT_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            if newline:
+                option |= orjson.OPT_APPEND_NEWLINE
+            return orjson.dumps(obj, default=self.default, option=option)
+        
+        def dumps(self, obj, **kwargs):
+            return self.encode(obj, indent=kwargs.get('indent')).decode()
+        
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+        
+        def response(self, *args, **kwargs):
+            # Same arguments and output as DefaultJSONProvider.response, but orjson's bytes go
+            # straight into the response instead of being decoded to str and re-encoded as UTF-8
+            if args and kwargs:
+                raise TypeError("app.json.response() takes either args or kwargs, not both")
+            obj = args[0] if len(args) == 1 else (args or kwargs or None)
+            pretty = self.compact is False or (self.compact is None and current_app.debug)
+            body = self.encode(obj, indent=pretty, newline=True)
+            return current_app.response_class(body, mimetype=self.mimetype)
+
+def use_orjson(app):
+    """Install OrjsonProvider on app when orjson is available; returns whether it was"""
+    if ORJSON_AVAILABLE:
+        app.json = OrjsonProvider(app)
+    return ORJSON_AVAILABLE
+
+# Manual CORS implementation (no flask-cors dependency)
+CORS_HEADERS = [
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Headers', 'Content-Type,Authorization'),
+    ('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+]
+
+def add_cors_headers(response):
+    """after_request hook adding CORS_HEADERS to every response"""
+    response.headers.extend(CORS_HEADERS)
+    return response
+
+def parse_int(value, default, upper):
+    """Parse a non-negative integer parameter capped at upper, or return default"""
+    text = str(value) if value is not None else ''
+    return min(int(text), upper) if text.isdecimal() else default
+
+def parse_flag(value, default=True):
+    """Parse a boolean parameter: a JSON bool, or a string other than false/0/no (any case)"""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ('false', '0', 'no')
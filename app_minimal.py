@@ -4,112 +4,32 @@ Ultra-minimal Flask API for Render deployment
 Zero external dependencies beyond Flask basics
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import os
-import re
-import json
 
-app = Flask(__name__)
-
-# Enable CORS manually without flask-cors dependency
-@app.after_request
-def after_request(response):
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-    return response
+from search_core import DOC_COUNT, chat_excerpt, highlight_text, query_terms, search_documents
+from api_common import add_cors_headers, parse_int, use_orjson
 
-# GDPR Documents with SharePoint URLs
-DOCUMENTS = [
-    {
-        'file_name': 'IC-GDPR-Compliance-Manual-Final_03_21.pdf',
-        'page_number': 1,
-        'text': 'GDPR Compliance Manual Final 03_21. This comprehensive document provides detailed guidance on GDPR compliance requirements, data protection principles, individual rights under the regulation, and implementation strategies for organizations.',
-        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EeQeUyussbhPuu1rsUudHeoBiCJ0kF6n5QHxfo8D7RAh2A?e=1xN8ld'
-    },
-    {
-        'file_name': 'GDPR-Final-EPSU.pdf',
-        'page_number': 1,
-        'text': 'GDPR Final EPSU document. European Public Service Union guidance on General Data Protection Regulation implementation, covering data protection principles, employee rights, and organizational compliance measures.',
-        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EWmQegZF3d1Orxp6erD-evkB6zWDz85NJid5N3DYJf950w?e=OZgzm2'
-    },
-    {
-        'file_name': 'LW-Privacy-GDPR-Compliance-Checklist.pdf',
-        'page_number': 1,
-        'text': 'Privacy GDPR Compliance Checklist. A comprehensive checklist for organizations to ensure GDPR compliance, covering data protection impact assessments, consent management, data subject rights, and privacy by design principles.',
-        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/ETtl-ZcFufVIuN6VwRGCLYMB8hYh53gYIGl7ybYCIElLEg?e=KHDM9m'
-    },
-    {
-        'file_name': 'Regulation-of-European-Parliament.pdf',
-        'page_number': 1,
-        'text': 'Regulation of European Parliament on data protection. Official regulation text covering the protection of natural persons with regard to the processing of personal data and on the free movement of such data.',
-        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EaeQ3ZsLSaFJnq0PgMp0SDoBGKRxrWL_E4Zh21rW9wVTtw?e=k2gmIr'
-    },
-    {
-        'file_name': 'Rights-of-Individuals-under-the-General-Data-Protection-RegulationAmendedApril.pdf',
-        'page_number': 1,
-        'text': 'Rights of Individuals under the General Data Protection Regulation (Amended April). Detailed guide covering individual rights including access, rectification, erasure, data portability, restriction of processing, and objection to processing.',
-        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EQy-AD8NoFFFk6DeUfOi1AMBhdoZvsO0Its6LCtYtasxUA?e=4QgvMx'
-    },
-    {
-        'file_name': 'Data-Processing-Agreement-Template.pdf',
-        'page_number': 1,
-        'text': 'Data Processing Agreement Template for GDPR compliance. This template establishes the relationship between data controllers and data processors, defining responsibilities, security measures, breach notification procedures, and contractual safeguards.',
-        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EeQeUyussbhPuu1rsUudHeoBiCJ0kF6n5QHxfo8D7RAh2A?e=1xN8ld'
-    },
-    {
-        'file_name': 'GDPR-Consent-Requirements.pdf',
-        'page_number': 1,
-        'text': 'GDPR Consent Requirements and best practices. Consent under GDPR must be freely given, specific, informed and unambiguous. Controllers must be able to demonstrate that consent was given, and individuals have the right to withdraw consent at any time.',
-        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EeQeUyussbhPuu1rsUudHeoBiCJ0kF6n5QHxfo8D7RAh2A?e=1xN8ld'
-    },
-    {
-        'file_name': 'Data-Protection-Principles.pdf',
-        'page_number': 1,
-        'text': 'Key data protection principles under GDPR including lawfulness, fairness and transparency, purpose limitation, data minimisation, accuracy, storage limitation, integrity and confidentiality, and accountability. Organizations must demonstrate compliance with these principles.',
-        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EaeQ3ZsLSaFJnq0PgMp0SDoBGKRxrWL_E4Zh21rW9wVTtw?e=k2gmIr'
-    }
-]
+app = Flask(__name__)
 
-def highlight_text(text, query):
-    """Simple text highlighting"""
-    words = query.lower().split()
-    result = text
-    for word in words:
-        if len(word) > 2:
-            pattern = re.compile(re.escape(word), re.IGNORECASE)
-            result = pattern.sub(f'<mark style="background-color: yellow; padding: 2px;">{word}</mark>', result)
-    return result
+use_orjson(app)
 
-def search_documents(query, max_results=5):
-    """Simple document search"""
-    query_lower = query.lower()
-    results = []
-    
-    for doc in DOCUMENTS:
-        if any(word in doc['text'].lower() for word in query_lower.split() if len(word) > 2):
-            doc_copy = doc.copy()
-            doc_copy['relevance_score'] = 0.8  # Fixed score for demo
-            doc_copy['highlighted_text'] = highlight_text(doc['text'], query)
-            results.append(doc_copy)
-    
-    return results[:max_results]
+# Enable CORS manually without flask-cors dependency
+app.after_request(add_cors_headers)
 
-@app.route('/')
-def home():
-    """API documentation"""
-    return f'''
+# Landing page HTML, built once; only the host URL changes per request
+HOME_TEMPLATE = '''
     <!DOCTYPE html>
     <html>
     <head>
         <title>PDF Search API</title>
         <style>
-            body {{ font-family: Arial, sans-serif; margin: 40px; background: #f5f7fa; }}
-            .container {{ max-width: 800px; margin: 0 auto; background: white; padding: 30px; border-radius: 8px; }}
-            .status {{ background: #d4edda; padding: 15px; border-radius: 5px; margin: 20px 0; border: 1px solid #c3e6cb; }}
-            .endpoint {{ background: #f8f9fa; padding: 15px; margin: 10px 0; border-radius: 5px; border-left: 4px solid #007bff; }}
-            a {{ color: #007bff; text-decoration: none; }}
-            .method {{ color: #007bff; font-weight: bold; }}
+            body { font-family: Arial, sans-serif; margin: 40px; background: #f5f7fa; }
+            .container { max-width: 800px; margin: 0 auto; background: white; padding: 30px; border-radius: 8px; }
+            .status { background: #d4edda; padding: 15px; border-radius: 5px; margin: 20px 0; border: 1px solid #c3e6cb; }
+            .endpoint { background: #f8f9fa; padding: 15px; margin: 10px 0; border-radius: 5px; border-left: 4px solid #007bff; }
+            a { color: #007bff; text-decoration: none; }
+            .method { color: #007bff; font-weight: bold; }
         </style>
     </head>
     <body>
@@ -117,8 +37,8 @@ def home():
             <h1>📄 PDF Search API</h1>
             <div class="status">
                 <h3>✅ Status: Online & Ready</h3>
-                <p><strong>Documents:</strong> {len(DOCUMENTS)} available</p>
-                <p><strong>Base URL:</strong> {request.host_url}</p>
+                <p><strong>Documents:</strong> {DOC_COUNT} available</p>
+                <p><strong>Base URL:</strong> {HOST_URL}</p>
             </div>
             
             <h2>🔌 API Endpoints</h2>
@@ -139,24 +59,29 @@ def home():
             <div class="endpoint">
                 <h3><span class="method">POST</span> /chat</h3>
                 <p>Conversational search (Copilot Studio compatible)</p>
-                <p><strong>Body:</strong> {{"message": "What are GDPR principles?"}}</p>
+                <p><strong>Body:</strong> {"message": "What are GDPR principles?"}</p>
             </div>
             
             <h2>🔗 Integration Examples</h2>
             <div class="endpoint">
                 <h4>Power Automate</h4>
-                <p><code>GET {request.host_url}search?q=[query]&max_results=5</code></p>
+                <p><code>GET {HOST_URL}search?q=[query]&max_results=5</code></p>
             </div>
             
             <div class="endpoint">
                 <h4>Copilot Studio</h4>
-                <p><code>POST {request.host_url}chat</code></p>
-                <p><code>{{"message": "[user question]"}}</code></p>
+                <p><code>POST {HOST_URL}chat</code></p>
+                <p><code>{"message": "[user question]"}</code></p>
             </div>
         </div>
     </body>
     </html>
-    '''
+    '''.replace('{DOC_COUNT}', str(DOC_COUNT))
+
+@app.route('/')
+def home():
+    """API documentation"""
+    return Response(HOME_TEMPLATE.replace('{HOST_URL}', request.host_url), mimetype='text/html')
 
 @app.route('/health')
 def health():
@@ -164,7 +89,7 @@ def health():
     return jsonify({
         'status': 'healthy',
         'service': 'PDF Search API',
-        'documents_count': len(DOCUMENTS),
+        'documents_count': DOC_COUNT,
         'version': '1.0.0',
         'endpoints': ['/health', '/search', '/chat']
     })
@@ -174,12 +99,12 @@ def search():
     """Search endpoint"""
     try:
         if request.method == 'POST':
-            data = request.get_json() or {}
+            data = request.get_json(silent=True, cache=False) or {}
             query = data.get('query', '')
-            max_results = data.get('max_results', 5)
+            max_results = parse_int(data.get('max_results'), 5, 20)
         else:
             query = request.args.get('q', '').strip()
-            max_results = int(request.args.get('max_results', 5))
+            max_results = parse_int(request.args.get('max_results'), 5, 20)
         
         if not query:
             return jsonify({
@@ -187,7 +112,7 @@ def search():
                 'error': 'Query parameter required'
             }), 400
         
-        results = search_documents(query, max_results)
+        results = search_documents(query_terms(query), max_results)
         
         return jsonify({
             'success': True,
@@ -206,7 +131,7 @@ def search():
 def chat():
     """Chat endpoint"""
     try:
-        data = request.get_json() or {}
+        data = request.get_json(silent=True, cache=False) or {}
         message = data.get('message', '').strip()
         
         if not message:
@@ -215,15 +140,20 @@ def chat():
                 'message': 'Message parameter required'
             }), 400
         
-        results = search_documents(message, 3)
+        # The raw text is fetched so excerpts can be cut before highlighting
+        terms = query_terms(message)
+        results = search_documents(terms, 3, highlight=False)
+        excerpts = [chat_excerpt(result['text'], terms) for result in results]
+        for result in results:
+            result['highlighted_text'] = highlight_text(result.pop('text'), terms)
         
         if not results:
             response_text = f"No relevant information found for '{message}'. Try different keywords."
         else:
             response_parts = [f"Found {len(results)} results for '{message}':\\n"]
-            for i, result in enumerate(results, 1):
+            for i, (result, excerpt) in enumerate(zip(results, excerpts), 1):
                 response_parts.append(f"**{i}. {result['file_name']} (Page {result['page_number']})**")
-                response_parts.append(result['highlighted_text'][:300] + "...")
+                response_parts.append(excerpt)
                 response_parts.append(f"[View Document]({result['url']})\\n")
             response_text = "\\n".join(response_parts)
         
@@ -5,6 +5,6 @@ echo "🚀 Building PDF Search API..."
 
 # Install dependencies
 pip install --upgrade pip
-pip install flask flask-cors gunicorn
+pip install flask flask-cors gunicorn orjson flask-compress
 
 echo "✅ Build completed successfully!"
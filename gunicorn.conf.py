@@ -0,0 +1,26 @@
+"""
+Gunicorn configuration for the PDF Search API
+Picked up automatically when gunicorn is started from the project root
+"""
+
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# Threaded workers: requests share one process' search data, so CPU-bound
+# search/encode calls overlap (and batch) instead of queueing behind each other
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', max(2, multiprocessing.cpu_count() // 2)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Load the app (documents, indices, models) once in the master and share it
+# copy-on-write with the forked workers
+preload_app = True
+
+def pre_fork(server, worker):
+    """Freeze the preloaded objects so worker GC passes don't touch (and un-share) their pages"""
+    gc.freeze()
+
+timeout = 120
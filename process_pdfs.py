@@ -4,12 +4,27 @@ PDF Processing Script - Extracts text from PDFs and creates search indices
 This script replicates the functionality of the Jupyter notebook
 """
 
+import bisect
+import contextlib
+import functools
 import os
 import glob
+import gzip
+import hashlib
+import heapq
+import io
+import multiprocessing
 import pickle
+import queue
 import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict
-import pandas as pd
 
 try:
     import fitz  # pymupdf
@@ -23,14 +38,344 @@ try:
     from sentence_transformers import SentenceTransformer
     import faiss
     import numpy as np
+    import scipy.sparse
     from sklearn.feature_extraction.text import TfidfVectorizer
-    from sklearn.metrics.pairwise import cosine_similarity
+    from sklearn.preprocessing import normalize
     ML_AVAILABLE = True
     print("✅ Machine learning packages available")
 except ImportError:
     ML_AVAILABLE = False
     print("⚠️ Machine learning packages not available - using basic search")
 
+try:
+    import onnxruntime
+    from transformers import AutoTokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+try:
+    from threadpoolctl import threadpool_limits
+    THREADPOOLCTL_AVAILABLE = True
+except ImportError:
+    THREADPOOLCTL_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Sentence embedding model, optionally served as an int8 ONNX Runtime export
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+ONNX_MODEL_DIR = 'minilm-onnx'
+ONNX_INT8_FILE = 'model_int8.onnx'
+MAX_SEQ_LENGTH = 256
+ENCODE_BATCH_SIZE = 64
+TORCH_THREADS = int(os.environ.get('TORCH_THREADS', max(1, (os.cpu_count() or 2) // 2)))
+
+class OnnxEncoder:
+    """int8 ONNX Runtime drop-in for SentenceTransformer.encode (mean pooling)"""
+    
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR):
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        # Same thread budget as the PyTorch path, with all graph fusions applied at load time
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = TORCH_THREADS
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, ONNX_INT8_FILE),
+            sess_options=options,
+            providers=['CPUExecutionProvider']
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+    
+    @staticmethod
+    def export(model_dir: str = ONNX_MODEL_DIR):
+        """Export the model to ONNX once and write a dynamically quantized int8 copy"""
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        
+        ORTModelForFeatureExtraction.from_pretrained(MODEL_NAME, export=True).save_pretrained(model_dir)
+        AutoTokenizer.from_pretrained(MODEL_NAME).save_pretrained(model_dir)
+        quantize_dynamic(
+            os.path.join(model_dir, 'model.onnx'),
+            os.path.join(model_dir, ONNX_INT8_FILE),
+            weight_type=QuantType.QInt8
+        )
+    
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False, show_progress_bar: bool = False):
+        # Smart batching: similar-length texts share a batch so little compute goes to padding
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        texts = [texts[i] for i in order]
+        
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True, truncation=True, max_length=MAX_SEQ_LENGTH, return_tensors='np'
+            )
+            feeds = {name: value.astype(np.int64) for name, value in inputs.items() if name in self.input_names}
+            token_embeddings = self.session.run(None, feeds)[0]
+            
+            # Mean-pool over real (non-padding) tokens
+            mask = inputs['attention_mask'][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(pooled.astype(np.float32))
+        
+        embeddings = np.vstack(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+        embeddings[order] = embeddings.copy()
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+def load_embedding_model():
+    """Prefer the int8 ONNX export when present, otherwise the PyTorch SentenceTransformer"""
+    if ONNX_AVAILABLE and os.path.exists(os.path.join(ONNX_MODEL_DIR, ONNX_INT8_FILE)):
+        print("✅ Using int8 ONNX Runtime encoder")
+        return OnnxEncoder()
+    
+    model = SentenceTransformer('all-MiniLM-L6-v2')
+    model.eval()
+    
+    # Hyperthreads only add contention to the small per-query matmuls
+    import torch
+    torch.set_num_threads(TORCH_THREADS)
+    return model
+
+def encode_context(model):
+    """Context for bulk encoding: no autograd bookkeeping, BLAS capped at TORCH_THREADS"""
+    stack = contextlib.ExitStack()
+    if THREADPOOLCTL_AVAILABLE:
+        stack.enter_context(threadpool_limits(limits=TORCH_THREADS, user_api='blas'))
+    if not isinstance(model, OnnxEncoder):
+        import torch
+        stack.enter_context(torch.inference_mode())
+    return stack
+
+# Replacement template for highlighted matches; \g<0> keeps the original casing
+HIGHLIGHT_TEMPLATE = r'<mark style="background-color: yellow; padding: 2px;">\g<0></mark>'
+
+# Query micro-batching: concurrent searches are coalesced into one encode call
+MAX_BATCH = 32
+MAX_WAIT_MS = 10
+
+class QueryBatcher:
+    """Coalesce concurrent query encodes into a single batched forward pass"""
+    
+    def __init__(self, model, max_batch: int = MAX_BATCH, max_wait_ms: int = MAX_WAIT_MS):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+    
+    def start(self):
+        """Start the background encode worker if it is not running"""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+                self._worker.start()
+    
+    def encode(self, query: str):
+        """Queue a query and block until its normalized (1, d) embedding is ready"""
+        self.start()
+        slot = {'event': threading.Event(), 'embedding': None, 'error': None}
+        self._queue.put((query, slot))
+        slot['event'].wait()
+        
+        if slot['error'] is not None:
+            raise slot['error']
+        return slot['embedding']
+    
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            
+            # Drain whatever arrives within the wait window, up to MAX_BATCH
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                embeddings = self.model.encode(
+                    [query for query, _ in batch],
+                    batch_size=self.max_batch,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    show_progress_bar=False
+                )
+                for (_, slot), embedding in zip(batch, embeddings):
+                    slot['embedding'] = embedding.astype(np.float32, copy=False).reshape(1, -1)
+            except Exception as e:
+                for _, slot in batch:
+                    slot['error'] = e
+            finally:
+                for _, slot in batch:
+                    slot['event'].set()
+
+def merge_top_k_numpy(keyword_scores, semantic_indices, semantic_scores, hybrid_weight: float, top_k: int):
+    """Blend keyword and semantic scores and return (final_scores, top_k indices best-first)"""
+    final_scores = (1.0 - hybrid_weight) * keyword_scores
+    final_scores[semantic_indices] += hybrid_weight * semantic_scores
+    
+    # Partial sort: only the top_k rows are ordered; partitioning from the top end avoids negating all N scores
+    n_docs = final_scores.shape[0]
+    k = min(top_k, n_docs)
+    top_idx = np.argpartition(final_scores, n_docs - k - 1)[n_docs - k:] if k < n_docs else np.arange(n_docs)
+    return final_scores, top_idx[np.argsort(-final_scores[top_idx], kind='stable')]
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, parallel=True)
+    def _merge_scores(keyword_scores, semantic_indices, semantic_scores, hybrid_weight):
+        final_scores = keyword_scores * np.float32(1.0 - hybrid_weight)
+        # FAISS ids are unique, so the parallel scatter never races
+        for i in prange(semantic_indices.size):
+            final_scores[semantic_indices[i]] += np.float32(hybrid_weight) * semantic_scores[i]
+        return final_scores
+    
+    @njit(cache=True)
+    def _top_k(scores, k):
+        # Fixed-size buffer holding the best k seen so far; replace its minimum on a better score
+        best = np.empty(k, dtype=np.int64)
+        if k == 0:
+            return best
+        for i in range(k):
+            best[i] = i
+        worst = 0
+        for i in range(1, k):
+            if scores[best[i]] < scores[best[worst]]:
+                worst = i
+        for i in range(k, scores.size):
+            if scores[i] > scores[best[worst]]:
+                best[worst] = i
+                worst = 0
+                for j in range(1, k):
+                    if scores[best[j]] < scores[best[worst]]:
+                        worst = j
+        return best[np.argsort(-scores[best], kind='mergesort')]
+    
+    def merge_top_k(keyword_scores, semantic_indices, semantic_scores, hybrid_weight: float, top_k: int):
+        """Numba-compiled equivalent of merge_top_k_numpy"""
+        final_scores = _merge_scores(keyword_scores, semantic_indices, semantic_scores, hybrid_weight)
+        return final_scores, _top_k(final_scores, min(top_k, final_scores.shape[0]))
+    
+    def warmup_merge_top_k():
+        """Compile the Numba kernels up front so the first search does not pay for it"""
+        merge_top_k(np.zeros(4, dtype=np.float32), np.arange(2, dtype=np.int64), np.ones(2, dtype=np.float32), 0.7, 2)
+else:
+    merge_top_k = merge_top_k_numpy
+    
+    def warmup_merge_top_k():
+        pass
+
+# Search data written by save_search_data() and read back by load_search_data().
+# The pickle holds documents and the vectorizer; the large arrays live in
+# side files that can be memory-mapped and shared between worker processes.
+DATA_FILE = 'pdf_search_data.pkl'
+EMBEDDINGS_FILE = 'pdf_search_embeddings.npy'
+TFIDF_FILE = 'pdf_search_tfidf'  # prefix of the .data/.indices/.indptr.npy CSR (and .csc.*.npy CSC) components
+TFIDF_PARTS = ('data', 'indices', 'indptr')
+INDEX_FILE = 'pdf_search_index.faiss'
+ZSTD_LEVEL = 3
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'  # zstd frame header, used to tell compressed data files from plain pickles
+GZIP_MAGIC = b'\x1f\x8b'
+READ_BUFFER_SIZE = 1 << 20
+
+def dump_pickle(obj, path: str):
+    """Pickle obj with the highest protocol, zstd-compressed when zstandard is installed"""
+    with open(path, 'wb') as f:
+        if ZSTD_AVAILABLE:
+            with zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=-1).stream_writer(f, closefd=False) as writer:
+                pickle.dump(obj, writer, protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_pickle(path: str):
+    """Load a pickle written by dump_pickle(), compressed (zstd or gzip) or plain"""
+    with open(path, 'rb') as f:
+        magic = f.read(len(ZSTD_MAGIC))
+        f.seek(0)
+        if magic.startswith(GZIP_MAGIC):
+            return load_gzip_pickle(path)
+        if magic != ZSTD_MAGIC:
+            return pickle.load(f)
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError(f"{path} is zstd-compressed - install zstandard to read it")
+        with zstandard.ZstdDecompressor().stream_reader(f, closefd=False) as reader:
+            return pickle.load(io.BufferedReader(reader, READ_BUFFER_SIZE))
+
+def load_gzip_pickle(path: str):
+    """Unpickle a gzip file, decompressing with multi-threaded pigz when it is on PATH"""
+    pigz = shutil.which('pigz')
+    if pigz is None:
+        with io.BufferedReader(gzip.open(path, 'rb'), READ_BUFFER_SIZE) as reader:
+            return pickle.load(reader)
+    
+    with subprocess.Popen([pigz, '-dc', path], stdout=subprocess.PIPE, bufsize=READ_BUFFER_SIZE) as proc:
+        data = pickle.load(proc.stdout)
+    if proc.returncode != 0:
+        raise RuntimeError(f"pigz failed to decompress {path} (exit code {proc.returncode})")
+    return data
+
+# Corpora at or above this many paragraphs get a sublinear IVF-PQ index
+IVF_MIN_DOCUMENTS = 10_000
+IVF_NPROBE = 16
+PQ_SUBQUANTIZERS = 16
+
+# Scratch memory reserved on the GPU when the index is moved there
+GPU_TEMP_MEMORY = 64 << 20
+
+# Per-query caches (embeddings, TF-IDF rows) keyed by the normalized query
+QUERY_CACHE_SIZE = 4096
+
+class LRUCache:
+    """Small thread-safe LRU mapping used for per-query caches"""
+    
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+    
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+_MISSING = object()
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def query_cache_key(query: str) -> bytes:
+    """Stable cache key for a query, insensitive to case and surrounding whitespace"""
+    return hashlib.blake2b(query.strip().lower().encode('utf-8'), digest_size=16).digest()
+
 class PDFSearchSystem:
     def __init__(self, pdf_directory="."):
         self.pdf_directory = pdf_directory
@@ -39,12 +384,37 @@ class PDFSearchSystem:
         self.index = None
         self.tfidf_vectorizer = None
         self.tfidf_matrix = None
+        self.query_batcher = None
+        self._emb_cache = LRUCache()
+        self._tfidf_cache = LRUCache()
+        self._pattern_cache = LRUCache()
+        self._gpu_resources = None
+        self._analyze = None
+        self._tfidf_csc = None
+        self._vocab = None
+        self._idf = None
+        self._basic_corpus = None
+        self._basic_offsets = None
+        self._text_lengths = []
+        
+        # Per-file paragraph counts and (first, last) page, tallied as files are extracted
+        self.file_counts = Counter()
+        self.page_ranges = {}
+        
+        # Column (SoA) views of self.documents used on the ML search path
+        self.file_names = None
+        self.page_numbers = None
+        self.paragraph_indices = None
+        self.urls = None
+        self.texts = []
         
         self.ML_AVAILABLE = ML_AVAILABLE
         if self.ML_AVAILABLE:
             try:
-                self.model = SentenceTransformer('all-MiniLM-L6-v2')
-                self.tfidf_vectorizer = TfidfVectorizer(stop_words='english', max_features=1000)
+                self.model = load_embedding_model()
+                self.tfidf_vectorizer = TfidfVectorizer(stop_words='english', max_features=1000, dtype=np.float32, sublinear_tf=True)
+                self.query_batcher = QueryBatcher(self.model)
+                warmup_merge_top_k()
                 print("✅ ML models initialized")
             except Exception as e:
                 print(f"⚠️ ML model initialization failed: {e}")
@@ -55,28 +425,27 @@ class PDFSearchSystem:
         documents = []
         
         try:
-            doc = fitz.open(pdf_path)
-            
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                text = page.get_text()
-                
-                if text.strip():
-                    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+            file_name = os.path.basename(pdf_path)
+            with fitz.open(pdf_path) as doc:
+                for page_num, page in enumerate(doc):
+                    # Text blocks come pre-segmented from MuPDF: (x0, y0, x1, y1, text, block_no, block_type)
+                    blocks = page.get_text("blocks")
+                    paragraphs = [p for p in (b[4].strip() for b in blocks if b[6] == 0) if p]
+                    if not paragraphs:
+                        continue
                     
+                    url = self.generate_pdf_url(pdf_path, page_num + 1)
                     for i, paragraph in enumerate(paragraphs):
                         if len(paragraph) > 50:
                             documents.append({
-                                'file_name': os.path.basename(pdf_path),
+                                'file_name': file_name,
                                 'file_path': pdf_path,
                                 'page_number': page_num + 1,
                                 'paragraph_index': i,
                                 'text': paragraph,
-                                'url': self.generate_pdf_url(pdf_path, page_num + 1)
+                                'url': url
                             })
             
-            doc.close()
-            
         except Exception as e:
             print(f"Error processing {pdf_path} with PyMuPDF: {str(e)}")
             
@@ -87,6 +456,7 @@ class PDFSearchSystem:
         documents = []
         
         try:
+            file_name = os.path.basename(pdf_path)
             with open(pdf_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 
@@ -94,19 +464,22 @@ class PDFSearchSystem:
                     page = pdf_reader.pages[page_num]
                     text = page.extract_text()
                     
-                    if text.strip():
-                        paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-                        
-                        for i, paragraph in enumerate(paragraphs):
-                            if len(paragraph) > 50:
-                                documents.append({
-                                    'file_name': os.path.basename(pdf_path),
-                                    'file_path': pdf_path,
-                                    'page_number': page_num + 1,
-                                    'paragraph_index': i,
-                                    'text': paragraph,
-                                    'url': self.generate_pdf_url(pdf_path, page_num + 1)
-                                })
+                    # Strip each paragraph once; an all-whitespace page yields no paragraphs
+                    paragraphs = [p for p in map(str.strip, text.split('\n\n')) if p]
+                    if not paragraphs:
+                        continue
+                    
+                    url = self.generate_pdf_url(pdf_path, page_num + 1)
+                    for i, paragraph in enumerate(paragraphs):
+                        if len(paragraph) > 50:
+                            documents.append({
+                                'file_name': file_name,
+                                'file_path': pdf_path,
+                                'page_number': page_num + 1,
+                                'paragraph_index': i,
+                                'text': paragraph,
+                                'url': url
+                            })
                                 
         except Exception as e:
             print(f"Error processing {pdf_path} with PyPDF2: {str(e)}")
@@ -143,17 +516,55 @@ class PDFSearchSystem:
         for pdf_file in pdf_files:
             print(f"  - {os.path.basename(pdf_file)}")
         
-        # Extract text from all PDFs
+        # Extract text from all PDFs, one file per worker process (parsing is CPU-bound)
         all_documents = []
-        for pdf_file in pdf_files:
-            docs = self.extract_text_from_pdf(pdf_file)
-            all_documents.extend(docs)
+        self.file_counts = Counter()
+        self.page_ranges = {}
+        if len(pdf_files) > 1:
+            workers = min(os.cpu_count() or 1, len(pdf_files))
+            with ProcessPoolExecutor(max_workers=workers, mp_context=pdf_pool_context()) as executor:
+                for docs in executor.map(extract_pdf_worker, pdf_files, chunksize=1):
+                    all_documents.extend(docs)
+                    self.tally_file(docs)
+        else:
+            for pdf_file in pdf_files:
+                docs = self.extract_text_from_pdf(pdf_file)
+                all_documents.extend(docs)
+                self.tally_file(docs)
         
         self.documents = all_documents
+        self.build_columns()
         print(f"\n📊 Total paragraphs extracted: {len(self.documents)}")
         
         return self.documents
     
+    def tally_file(self, docs: List[Dict]):
+        """Add one extracted file's paragraphs to the per-file summary counters"""
+        if not docs:
+            return
+        
+        # Paragraphs arrive in page order, so the first and last rows bound the page range
+        file_name = docs[0]['file_name']
+        first_page, last_page = docs[0]['page_number'], docs[-1]['page_number']
+        self.file_counts[file_name] += len(docs)
+        if file_name in self.page_ranges:
+            low, high = self.page_ranges[file_name]
+            first_page, last_page = min(low, first_page), max(high, last_page)
+        self.page_ranges[file_name] = (first_page, last_page)
+    
+    def build_columns(self):
+        """Split self.documents into per-field arrays so results can be gathered by row index"""
+        self.build_basic_corpus()
+        if not self.ML_AVAILABLE:
+            return
+        
+        docs = self.documents
+        self.file_names = np.array([d['file_name'] for d in docs], dtype=object)
+        self.page_numbers = np.array([d['page_number'] for d in docs], dtype=np.int32)
+        self.paragraph_indices = np.array([d['paragraph_index'] for d in docs], dtype=np.int32)
+        self.urls = np.array([d['url'] for d in docs], dtype=object)
+        self.texts = [d['text'] for d in docs]
+    
     def create_embeddings(self):
         """Create embeddings for all documents"""
         if not self.documents:
@@ -168,19 +579,28 @@ class PDFSearchSystem:
             print("Creating embeddings...")
             texts = [doc['text'] for doc in self.documents]
             
-            # Create sentence embeddings
-            self.embeddings = self.model.encode(texts)
+            # Create sentence embeddings, L2-normalized for cosine similarity
+            # (the encoder groups texts by length to cut padding)
+            with encode_context(self.model):
+                self.embeddings = self.model.encode(
+                    texts,
+                    batch_size=ENCODE_BATCH_SIZE,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    show_progress_bar=False
+                )
             
             # Create FAISS index for fast similarity search
-            dimension = self.embeddings.shape[1]
-            self.index = faiss.IndexFlatIP(dimension)
-            
-            # Normalize embeddings for cosine similarity
-            faiss.normalize_L2(self.embeddings)
-            self.index.add(self.embeddings)
+            self.index = self.build_index(self.embeddings)
             
             # Create TF-IDF matrix for keyword-based search
-            self.tfidf_matrix = self.tfidf_vectorizer.fit_transform(texts)
+            self.tfidf_matrix = self.prepare_tfidf_matrix(self.tfidf_vectorizer.fit_transform(texts))
+            
+            # Cached query vectors are only valid for the index they were built against
+            self._emb_cache.clear()
+            self._tfidf_cache.clear()
+            self._analyze = None
+            self._tfidf_csc = None
             
             print("✅ Embeddings created successfully!")
             return True
@@ -189,91 +609,375 @@ class PDFSearchSystem:
             print(f"❌ Error creating embeddings: {e}")
             return False
     
+    def build_index(self, embeddings):
+        """Build an inner-product index over normalized embeddings, sized to the corpus"""
+        n_vectors, dimension = embeddings.shape
+        
+        if n_vectors < IVF_MIN_DOCUMENTS or dimension % PQ_SUBQUANTIZERS:
+            # Small corpus: exhaustive scan over int8 scalar-quantized vectors
+            index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        else:
+            # Large corpus: probe a few inverted lists of PQ-compressed vectors
+            quantizer = faiss.IndexFlatIP(dimension)
+            nlist = max(int(4 * n_vectors ** 0.5), 16)
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, PQ_SUBQUANTIZERS, 8, faiss.METRIC_INNER_PRODUCT)
+        
+        # Explicit row ids let paragraphs be removed or re-added without rebuilding the index
+        index = faiss.IndexIDMap(index)
+        index.train(embeddings)
+        index.add_with_ids(embeddings, np.arange(n_vectors, dtype=np.int64))
+        return self.configure_index(index)
+    
+    def configure_index(self, index):
+        """Apply query-time parameters that are not stored with the index and move it to the GPU if present"""
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = IVF_NPROBE
+        
+        if hasattr(faiss, 'StandardGpuResources') and faiss.get_num_gpus() > 0:
+            if ivf is None:
+                # FAISS has no GPU version of the flat scalar-quantizer index used for small corpora
+                print(f"ℹ️ Keeping FAISS index on CPU: no GPU support for flat scalar-quantized indexes "
+                      f"(GPU is used from {IVF_MIN_DOCUMENTS:,} paragraphs, with IVF-PQ)")
+                return index
+            try:
+                if self._gpu_resources is None:
+                    self._gpu_resources = faiss.StandardGpuResources()
+                    self._gpu_resources.setTempMemory(GPU_TEMP_MEMORY)
+                index = faiss.index_cpu_to_gpu(self._gpu_resources, 0, index)
+            except Exception as e:
+                print(f"⚠️ Keeping FAISS index on CPU: {e}")
+        return index
+    
+    def prepare_tfidf_matrix(self, tfidf_matrix):
+        """L2-normalize TF-IDF rows once so keyword scoring is a plain sparse dot product"""
+        return normalize(tfidf_matrix, norm='l2', copy=False).tocsr()
+    
+    def save_index(self, index_file: str = INDEX_FILE) -> bool:
+        """Persist the trained FAISS index so loaders can skip retraining"""
+        if self.index is None:
+            return False
+        
+        index = self.index
+        if self._gpu_resources is not None:
+            # The GPU copy is an IndexIDMap around a GPU sub-index, so test for GPU use rather than
+            # the outer type; cloning back to CPU is harmless if the move to the GPU had failed
+            index = faiss.index_gpu_to_cpu(index)
+        faiss.write_index(index, index_file)
+        return True
+    
+    def read_index(self, index_file: str = INDEX_FILE):
+        """Memory-map a persisted FAISS index, falling back to a regular read"""
+        try:
+            index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            index = faiss.read_index(index_file)
+        return self.configure_index(index)
+    
+    def save_search_data(self, data_file: str = DATA_FILE, embeddings_file: str = EMBEDDINGS_FILE,
+                         tfidf_file: str = TFIDF_FILE, index_file: str = INDEX_FILE) -> bool:
+        """Write the slim pickle plus the embedding, TF-IDF and FAISS side files"""
+        search_data = {
+            'documents': self.documents,
+            'tfidf_vectorizer': self.tfidf_vectorizer,
+            'tfidf_shape': None if self.tfidf_matrix is None else self.tfidf_matrix.shape
+        }
+        
+        dump_pickle(search_data, data_file)
+        
+        if self.embeddings is not None:
+            # FP16 halves the side file; loaders upcast to FP32 before (re)building the index
+            np.save(embeddings_file, self.embeddings.astype(np.float16))
+        if self.tfidf_matrix is not None:
+            # Raw CSR components as plain .npy files so loaders can memory-map them; the column-major
+            # copy used by keyword_scores is stored too, so workers map it instead of each building one
+            csc = self.tfidf_matrix.tocsc()
+            for part in TFIDF_PARTS:
+                np.save(f"{tfidf_file}.{part}.npy", getattr(self.tfidf_matrix, part))
+                np.save(f"{tfidf_file}.csc.{part}.npy", getattr(csc, part))
+        self.save_index(index_file)
+        
+        return True
+    
+    def migrate_search_data(self, data_file: str = DATA_FILE) -> bool:
+        """Split a legacy single-pickle data file into the slim pickle and side files"""
+        search_data = load_pickle(data_file)
+        
+        if search_data.get('embeddings') is None and search_data.get('tfidf_matrix') is None:
+            print(f"ℹ️ {data_file} has no embedded arrays - nothing to migrate")
+            return False
+        
+        self.documents = search_data['documents']
+        self.embeddings = search_data.get('embeddings')
+        self.tfidf_vectorizer = search_data.get('tfidf_vectorizer')
+        self.tfidf_matrix = search_data.get('tfidf_matrix')
+        
+        if self.embeddings is not None:
+            faiss.normalize_L2(self.embeddings)
+            self.index = self.build_index(self.embeddings)
+        
+        self.save_search_data(data_file)
+        print(f"✅ Migrated {data_file} to memory-mappable side files")
+        return True
+    
+    def load_search_data(self, data_file: str = DATA_FILE, embeddings_file: str = EMBEDDINGS_FILE,
+                         tfidf_file: str = TFIDF_FILE, index_file: str = INDEX_FILE) -> bool:
+        """Load documents, TF-IDF data and the FAISS index written by save_search_data()"""
+        try:
+            search_data = load_pickle(data_file)
+        except Exception as e:
+            print(f"❌ Error loading search data: {e}")
+            return False
+        
+        self.documents = search_data['documents']
+        self.build_columns()
+        self.tfidf_vectorizer = search_data.get('tfidf_vectorizer')
+        self.tfidf_matrix = search_data.get('tfidf_matrix')
+        self.index = None
+        self._emb_cache.clear()
+        self._tfidf_cache.clear()
+        self._analyze = None
+        self._tfidf_csc = None
+        
+        # Legacy data files embed the arrays in the pickle; newer ones keep them in side files
+        embeddings = search_data.get('embeddings')
+        if self.ML_AVAILABLE:
+            if self.tfidf_matrix is not None:
+                self.tfidf_matrix = self.prepare_tfidf_matrix(self.tfidf_matrix)
+            elif search_data.get('tfidf_shape') is not None and os.path.exists(f"{tfidf_file}.data.npy"):
+                # Zero-copy CSR view over memory-mapped components (already normalized when saved)
+                shape = tuple(search_data['tfidf_shape'])
+                parts = tuple(np.load(f"{tfidf_file}.{part}.npy", mmap_mode='r') for part in TFIDF_PARTS)
+                self.tfidf_matrix = scipy.sparse.csr_matrix(parts, shape=shape, copy=False)
+                if os.path.exists(f"{tfidf_file}.csc.data.npy"):
+                    parts = tuple(np.load(f"{tfidf_file}.csc.{part}.npy", mmap_mode='r') for part in TFIDF_PARTS)
+                    self._tfidf_csc = scipy.sparse.csc_matrix(parts, shape=shape, copy=False)
+            if self.tfidf_matrix is not None and self._tfidf_csc is None:
+                # No CSC side file (legacy pickle or older save): build it now, before gunicorn forks
+                # the preloaded app, so workers share it instead of each copying on first query
+                self._tfidf_csc = self.tfidf_matrix.tocsc()
+            if embeddings is None and os.path.exists(embeddings_file):
+                embeddings = np.load(embeddings_file, mmap_mode='r')
+        
+        if self.ML_AVAILABLE and self.tfidf_matrix is not None:
+            if os.path.exists(index_file):
+                self.index = self.read_index(index_file)
+            elif embeddings is not None:
+                embeddings = np.array(embeddings, dtype=np.float32)
+                faiss.normalize_L2(embeddings)
+                self.index = self.build_index(embeddings)
+        
+        # The quantized index replaces the FP32 embeddings at query time
+        self.embeddings = None
+        
+        print(f"✅ Loaded {len(self.documents)} paragraphs from {data_file}")
+        return True
+    
+    def highlight_pattern(self, query: str):
+        """Compiled alternation of the query terms (None if nothing to highlight), cached per query"""
+        key = query_cache_key(query)
+        pattern = self._pattern_cache.get(key, _MISSING)
+        if pattern is _MISSING:
+            # Longest terms first so overlapping terms highlight the longer match
+            query_terms = sorted({term for term in query.lower().split() if len(term) > 2}, key=len, reverse=True)
+            pattern = re.compile('|'.join(re.escape(term) for term in query_terms), re.IGNORECASE) if query_terms else None
+            self._pattern_cache.put(key, pattern)
+        return pattern
+    
     def highlight_text(self, text: str, query: str) -> str:
-        """Highlight query terms in text"""
-        query_terms = query.lower().split()
-        highlighted_text = text
-        
-        for term in query_terms:
-            if len(term) > 2:
-                pattern = re.compile(re.escape(term), re.IGNORECASE)
-                highlighted_text = pattern.sub(
-                    f'<mark style="background-color: yellow; padding: 2px;">{term}</mark>',
-                    highlighted_text
-                )
+        """Highlight query terms in text in a single pass"""
+        pattern = self.highlight_pattern(query)
+        if pattern is None:
+            return text
         
-        return highlighted_text
+        return pattern.sub(HIGHLIGHT_TEMPLATE, text)
     
-    def search_basic(self, query: str, top_k: int = 5) -> List[Dict]:
+    def build_basic_corpus(self):
+        """Lowercase every paragraph once and join them into one string, recording each start offset"""
+        texts_lower = [doc['text'].lower() for doc in self.documents]
+        offsets = []
+        position = 0
+        for text in texts_lower:
+            offsets.append(position)
+            position += len(text) + 1
+        offsets.append(position)
+        self._basic_corpus = '\n'.join(texts_lower)
+        self._basic_offsets = offsets
+        self._text_lengths = [len(doc['text']) for doc in self.documents]
+    
+    def search_basic(self, query: str, top_k: int = 5, highlight: bool = True) -> List[Dict]:
         """Basic text search without ML"""
-        query_lower = query.lower()
-        results = []
+        terms = list(dict.fromkeys(query.lower().split()))
+        if not terms:
+            return []
+        if self._basic_corpus is None:
+            self.build_basic_corpus()
+        
+        # One regex scan over the joined corpus in C; after a hit, resume at the next paragraph
+        # (terms never contain whitespace, so a match cannot straddle the newline separators)
+        corpus, offsets = self._basic_corpus, self._basic_offsets
+        pattern = re.compile('|'.join(re.escape(term) for term in terms))
+        hits = []
+        position = 0
+        while True:
+            match = pattern.search(corpus, position)
+            if match is None:
+                break
+            i = bisect.bisect_right(offsets, match.start()) - 1
+            hits.append(i)
+            position = offsets[i + 1]
+        
+        # Rank hit row ids by text length as a simple relevance measure; only the returned rows become dicts
+        results = [
+            {**self.documents[i], 'relevance_score': 0.5}  # Basic score
+            for i in heapq.nlargest(top_k, hits, key=self._text_lengths.__getitem__)
+        ]
+        if highlight:
+            pattern = self.highlight_pattern(query)
+            for result in results:
+                result['highlighted_text'] = pattern.sub(HIGHLIGHT_TEMPLATE, result['text']) if pattern else result['text']
+        return results
+    
+    def encode_query(self, query: str):
+        """Return the L2-normalized (1, d) query embedding, cached per normalized query"""
+        key = query_cache_key(query)
+        embedding = self._emb_cache.get(key)
+        if embedding is None:
+            embedding = self.query_batcher.encode(query)
+            self._emb_cache.put(key, embedding)
+        return embedding
+    
+    def transform_query(self, query: str):
+        """Return the L2-normalized TF-IDF row for a query, cached per normalized query"""
+        key = query_cache_key(query)
+        query_tfidf = self._tfidf_cache.get(key)
+        if query_tfidf is None:
+            query_tfidf = normalize(self.vectorize_query(query), norm='l2', copy=False)
+            self._tfidf_cache.put(key, query_tfidf)
+        return query_tfidf
+    
+    def vectorize_query(self, query: str):
+        """Build the raw 1 x V TF-IDF row straight from the fitted vocabulary and idf weights"""
+        if self._analyze is None:
+            self._analyze = self.tfidf_vectorizer.build_analyzer()
+            self._vocab = self.tfidf_vectorizer.vocabulary_
+            self._idf = self.tfidf_vectorizer.idf_
+        
+        counts = Counter(term for term in self._analyze(query) if term in self._vocab)
+        cols = np.fromiter((self._vocab[term] for term in counts), dtype=np.int32, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        if self.tfidf_vectorizer.sublinear_tf:
+            tf = 1.0 + np.log(tf)
+        
+        return scipy.sparse.csr_matrix(
+            (tf * self._idf[cols], (np.zeros(len(cols), dtype=np.int32), cols)),
+            shape=(1, len(self._vocab))
+        )
+    
+    def keyword_scores(self, query_tfidf):
+        """TF-IDF dot product of every paragraph with an L2-normalized query row"""
+        cols, weights = query_tfidf.indices, query_tfidf.data
+        indptr = self.tfidf_matrix.indptr
         
-        for doc in self.documents:
-            if any(term in doc['text'].lower() for term in query_lower.split()):
-                doc_copy = doc.copy()
-                doc_copy['relevance_score'] = 0.5  # Basic score
-                doc_copy['highlighted_text'] = self.highlight_text(doc['text'], query)
-                results.append(doc_copy)
+        if self._tfidf_csc is None:
+            # Only for a matrix built in this process; loaded data comes with its CSC copy
+            self._tfidf_csc = self.tfidf_matrix.tocsc()
+        csc = self._tfidf_csc
         
-        # Sort by text length as a simple relevance measure
-        results.sort(key=lambda x: len(x['text']), reverse=True)
-        return results[:top_k]
+        # Short queries touch only a few term columns: scatter those instead of scanning every row
+        touched = int((csc.indptr[cols + 1] - csc.indptr[cols]).sum())
+        if touched * 4 >= indptr[-1]:
+            return (self.tfidf_matrix @ query_tfidf.T).toarray().ravel().astype(np.float32)
+        
+        scores = np.zeros(self.tfidf_matrix.shape[0], dtype=np.float32)
+        for col, weight in zip(cols, weights):
+            start, end = csc.indptr[col], csc.indptr[col + 1]
+            scores[csc.indices[start:end]] += weight * csc.data[start:end]
+        return scores
     
-    def search_ml(self, query: str, top_k: int = 5, hybrid_weight: float = 0.7) -> List[Dict]:
+    def search_ml(self, query: str, top_k: int = 5, hybrid_weight: float = 0.7, highlight: bool = True) -> List[Dict]:
         """ML-based search with embeddings"""
-        if self.embeddings is None:
+        if self.index is None:
             print("Embeddings not created. Using basic search.")
-            return self.search_basic(query, top_k)
+            return self.search_basic(query, top_k, highlight)
         
         try:
-            # Semantic search using embeddings
-            query_embedding = self.model.encode([query])
-            faiss.normalize_L2(query_embedding)
+            # Semantic search using embeddings (batched with concurrent queries, already L2-normalized)
+            query_embedding = np.ascontiguousarray(self.encode_query(query), dtype=np.float32)
             
             semantic_scores, semantic_indices = self.index.search(query_embedding, min(top_k * 2, len(self.documents)))
             semantic_scores = semantic_scores[0]
             semantic_indices = semantic_indices[0]
             
             # Keyword search using TF-IDF
-            query_tfidf = self.tfidf_vectorizer.transform([query])
-            keyword_scores = cosine_similarity(query_tfidf, self.tfidf_matrix)[0]
-            
-            # Combine scores
-            final_scores = {}
-            
-            for i, idx in enumerate(semantic_indices):
-                if idx < len(self.documents):
-                    final_scores[idx] = hybrid_weight * semantic_scores[i]
+            query_tfidf = self.transform_query(query)
+            keyword_scores = self.keyword_scores(query_tfidf)
             
-            for idx, score in enumerate(keyword_scores):
-                if idx in final_scores:
-                    final_scores[idx] += (1 - hybrid_weight) * score
-                else:
-                    final_scores[idx] = (1 - hybrid_weight) * score
-            
-            # Sort by combined score
-            sorted_results = sorted(final_scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+            # Combine scores: keyword score for every doc plus semantic score scattered onto the FAISS hits
+            # (FAISS pads missing hits with -1, e.g. when IVF probing finds fewer than k; that tail is the
+            # only invalid case, so a single check on the last slot decides whether masking is needed)
+            if semantic_indices.size and semantic_indices[-1] < 0:
+                valid = semantic_indices >= 0
+                semantic_indices, semantic_scores = semantic_indices[valid], semantic_scores[valid]
+            final_scores, top_idx = merge_top_k(
+                keyword_scores.astype(np.float32, copy=False),
+                semantic_indices.astype(np.int64, copy=False),
+                semantic_scores.astype(np.float32, copy=False),
+                hybrid_weight,
+                top_k
+            )
             
+            # Build result rows for the top_k hits only, gathering each field column once
+            pattern = self.highlight_pattern(query) if highlight else None
             results = []
-            for idx, score in sorted_results:
-                doc = self.documents[idx].copy()
-                doc['relevance_score'] = float(score)
-                doc['highlighted_text'] = self.highlight_text(doc['text'], query)
-                results.append(doc)
+            rows = zip(
+                self.file_names[top_idx].tolist(),
+                self.page_numbers[top_idx].tolist(),
+                self.paragraph_indices[top_idx].tolist(),
+                self.urls[top_idx].tolist(),
+                final_scores[top_idx].tolist(),
+                top_idx.tolist()
+            )
+            for file_name, page_number, paragraph_index, url, score, idx in rows:
+                text = self.texts[idx]
+                result = {
+                    'file_name': file_name,
+                    'page_number': page_number,
+                    'paragraph_index': paragraph_index,
+                    'text': text,
+                    'url': url,
+                    'relevance_score': score
+                }
+                if highlight:
+                    result['highlighted_text'] = pattern.sub(HIGHLIGHT_TEMPLATE, text) if pattern else text
+                results.append(result)
             
             return results
             
         except Exception as e:
             print(f"ML search error: {e}")
-            return self.search_basic(query, top_k)
+            return self.search_basic(query, top_k, highlight)
     
-    def search(self, query: str, top_k: int = 5) -> List[Dict]:
-        """Main search function"""
-        if self.ML_AVAILABLE and self.embeddings is not None:
-            return self.search_ml(query, top_k)
+    def search(self, query: str, top_k: int = 5, highlight: bool = True) -> List[Dict]:
+        """Main search function; highlight=False skips building highlighted_text"""
+        if self.ML_AVAILABLE and self.index is not None:
+            return self.search_ml(query, top_k, highlight=highlight)
         else:
-            return self.search_basic(query, top_k)
+            return self.search_basic(query, top_k, highlight)
+
+def pdf_pool_context():
+    """Start extraction workers from a clean fork server rather than forking this process,
+    which is unsafe once numba/BLAS thread pools are running (spawn where forkserver is missing)"""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+def extract_pdf_worker(pdf_path: str) -> List[Dict]:
+    """Process-pool entry point: extract one PDF without running __init__ (no model load per worker)"""
+    extractor = PDFSearchSystem.__new__(PDFSearchSystem)
+    return extractor.extract_text_from_pdf(pdf_path)
 
 def main():
     print("🔍 PDF Search System - Processing PDFs")
@@ -290,16 +994,15 @@ def main():
         return False
     
     # Display summary
-    df = pd.DataFrame(documents)
     print("\n📋 Document Summary")
     print("-" * 30)
     print(f"Total paragraphs: {len(documents)}")
     print("\nDocuments by file:")
-    print(df['file_name'].value_counts())
+    for file_name, count in pdf_search.file_counts.most_common():
+        print(f"  {file_name}: {count}")
     print("\nPages covered:")
-    for file_name in df['file_name'].unique():
-        file_docs = df[df['file_name'] == file_name]
-        print(f"  {file_name}: Pages {file_docs['page_number'].min()}-{file_docs['page_number'].max()}")
+    for file_name, (first_page, last_page) in pdf_search.page_ranges.items():
+        print(f"  {file_name}: Pages {first_page}-{last_page}")
     
     # Create embeddings
     embeddings_created = pdf_search.create_embeddings()
@@ -323,24 +1026,28 @@ def main():
     print("\n💾 Saving Search Data")
     print("-" * 25)
     
-    search_data = {
-        'documents': pdf_search.documents,
-        'embeddings': pdf_search.embeddings,
-        'tfidf_vectorizer': pdf_search.tfidf_vectorizer,
-        'tfidf_matrix': pdf_search.tfidf_matrix
-    }
-    
     try:
-        with open('pdf_search_data.pkl', 'wb') as f:
-            pickle.dump(search_data, f)
-        print("✅ Search data saved successfully to 'pdf_search_data.pkl'")
-        print("   This file will be used by the Flask API.")
+        pdf_search.save_search_data()
+        print(f"✅ Search data saved successfully to '{DATA_FILE}'")
+        if pdf_search.index is not None:
+            print(f"✅ Embeddings, TF-IDF matrix and FAISS index saved to '{EMBEDDINGS_FILE}', '{TFIDF_FILE}.*.npy', '{INDEX_FILE}'")
+        print("   These files will be used by the Flask API.")
         return True
     except Exception as e:
         print(f"❌ Error saving search data: {e}")
         return False
 
 if __name__ == "__main__":
+    if sys.argv[1:] == ['--migrate']:
+        # One-shot split of an existing single-pickle data file
+        sys.exit(0 if PDFSearchSystem(".").migrate_search_data() else 1)
+    
+    if sys.argv[1:] == ['--export-onnx']:
+        # One-shot export of the int8 ONNX encoder picked up by load_embedding_model()
+        OnnxEncoder.export()
+        print(f"✅ int8 ONNX model written to '{ONNX_MODEL_DIR}'")
+        sys.exit(0)
+    
     success = main()
     if success:
         print("\n🎉 PDF processing completed successfully!")
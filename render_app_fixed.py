@@ -4,14 +4,26 @@ Fixed Flask API for Render deployment
 Simplified to avoid common deployment issues
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+import heapq
 import os
 import re
-import json
+from collections import defaultdict
+from functools import lru_cache
 from typing import List, Dict
 import logging
 
+from search_core import BM25_K1, DOC_COUNT, DOC_LENGTHS, DOCUMENTS, IDF, POSTINGS, bm25, is_word_char, word_start
+from search_core import query_terms as parse_query
+from api_common import parse_int, use_orjson
+
+try:
+    from flask_compress import Compress
+    COMPRESS_AVAILABLE = True
+except ImportError:
+    COMPRESS_AVAILABLE = False
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -19,142 +31,164 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
-# GDPR Documents with SharePoint URLs
-DOCUMENTS = [
-    {
-        'file_name': 'IC-GDPR-Compliance-Manual-Final_03_21.pdf',
-        'file_path': 'Files/IC-GDPR-Compliance-Manual-Final_03_21.pdf',
-        'page_number': 1,
-        'paragraph_index': 0,
-        'text': 'GDPR Compliance Manual Final 03_21. This comprehensive document provides detailed guidance on GDPR compliance requirements, data protection principles, individual rights under the regulation, and implementation strategies for organizations.',
-        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EeQeUyussbhPuu1rsUudHeoBiCJ0kF6n5QHxfo8D7RAh2A?e=1xN8ld'
-    },
-    {
-        'file_name': 'GDPR-Final-EPSU.pdf',
-        'file_path': 'Files/GDPR-Final-EPSU.pdf',
-        'page_number': 1,
-        'paragraph_index': 0,
-        'text': 'GDPR Final EPSU document. European Public Service Union guidance on General Data Protection Regulation implementation, covering data protection principles, employee rights, and organizational compliance measures.',
-        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EWmQegZF3d1Orxp6erD-evkB6zWDz85NJid5N3DYJf950w?e=OZgzm2'
-    },
-    {
-        'file_name': 'LW-Privacy-GDPR-Compliance-Checklist.pdf',
-        'file_path': 'Files/LW-Privacy-GDPR-Compliance-Checklist.pdf',
-        'page_number': 1,
-        'paragraph_index': 0,
-        'text': 'Privacy GDPR Compliance Checklist. A comprehensive checklist for organizations to ensure GDPR compliance, covering data protection impact assessments, consent management, data subject rights, and privacy by design principles.',
-        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/ETtl-ZcFufVIuN6VwRGCLYMB8hYh53gYIGl7ybYCIElLEg?e=KHDM9m'
-    },
-    {
-        'file_name': 'Regulation-of-European-Parliament.pdf',
-        'file_path': 'Files/Regulation of European Parliament.pdf',
-        'page_number': 1,
-        'paragraph_index': 0,
-        'text': 'Regulation of European Parliament on data protection. Official regulation text covering the protection of natural persons with regard to the processing of personal data and on the free movement of such data.',
-        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EaeQ3ZsLSaFJnq0PgMp0SDoBGKRxrWL_E4Zh21rW9wVTtw?e=k2gmIr'
-    },
-    {
-        'file_name': 'Rights-of-Individuals-under-the-General-Data-Protection-RegulationAmendedApril.pdf',
-        'file_path': 'Files/Rights-of-Individuals-under-the-General-Data-Protection-RegulationAmendedApril.pdf',
-        'page_number': 1,
-        'paragraph_index': 0,
-        'text': 'Rights of Individuals under the General Data Protection Regulation (Amended April). Detailed guide covering individual rights including access, rectification, erasure, data portability, restriction of processing, and objection to processing.',
-        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EQy-AD8NoFFFk6DeUfOi1AMBhdoZvsO0Its6LCtYtasxUA?e=4QgvMx'
-    },
-    {
-        'file_name': 'Data-Processing-Agreement-Template.pdf',
-        'file_path': 'Files/Data-Processing-Agreement-Template.pdf',
-        'page_number': 1,
-        'paragraph_index': 0,
-        'text': 'Data Processing Agreement Template for GDPR compliance. This template establishes the relationship between data controllers and data processors, defining responsibilities, security measures, breach notification procedures, and contractual safeguards.',
-        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EeQeUyussbhPuu1rsUudHeoBiCJ0kF6n5QHxfo8D7RAh2A?e=1xN8ld'
-    },
-    {
-        'file_name': 'GDPR-Consent-Requirements.pdf',
-        'file_path': 'Files/GDPR-Consent-Requirements.pdf',
-        'page_number': 1,
-        'paragraph_index': 0,
-        'text': 'GDPR Consent Requirements and best practices. Consent under GDPR must be freely given, specific, informed and unambiguous. Controllers must be able to demonstrate that consent was given, and individuals have the right to withdraw consent at any time.',
-        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EeQeUyussbhPuu1rsUudHeoBiCJ0kF6n5QHxfo8D7RAh2A?e=1xN8ld'
-    },
-    {
-        'file_name': 'Data-Protection-Principles.pdf',
-        'file_path': 'Files/Data-Protection-Principles.pdf',
-        'page_number': 1,
-        'paragraph_index': 0,
-        'text': 'Key data protection principles under GDPR including lawfulness, fairness and transparency, purpose limitation, data minimisation, accuracy, storage limitation, integrity and confidentiality, and accountability. Organizations must demonstrate compliance with these principles.',
-        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EaeQ3ZsLSaFJnq0PgMp0SDoBGKRxrWL_E4Zh21rW9wVTtw?e=k2gmIr'
-    }
-]
+if COMPRESS_AVAILABLE:
+    # Search results repeat the same keys and markup, so they compress several-fold; tiny bodies are left alone
+    app.config['COMPRESS_MIMETYPES'] = ['text/html', 'application/json']
+    app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+    app.config['COMPRESS_MIN_SIZE'] = 1024
+    Compress(app)
 
-def highlight_text(text: str, query: str) -> str:
-    """Highlight query terms in text"""
-    query_terms = [term for term in query.lower().split() if len(term) > 2]
-    highlighted_text = text
-    
-    for term in query_terms:
-        pattern = re.compile(re.escape(term), re.IGNORECASE)
-        highlighted_text = pattern.sub(
-            f'<mark style="background-color: yellow; padding: 2px; border-radius: 3px;">{term}</mark>',
-            highlighted_text
-        )
-    
-    return highlighted_text
+use_orjson(app)
+
+# Column (SoA) view of DOCUMENTS: result rows are assembled from these by doc id
+DOC_FIELDS = ('file_name', 'file_path', 'page_number', 'paragraph_index', 'text', 'url')
+COLUMNS = {field: tuple(doc[field] for doc in DOCUMENTS) for field in DOC_FIELDS}
+TEXTS = COLUMNS['text']
+TEXTS_LOWER = [text.lower() for text in TEXTS]
+
+# BM25 with eager scoring: every (term, document) contribution from search_core's index is
+# computed once at import, so a query only sums the precomputed posting lists of its terms
+BM25_POSTINGS = {
+    term: [(doc_id, bm25(IDF[term], tf, DOC_LENGTHS[doc_id])) for doc_id, tf in postings]
+    for term, postings in POSTINGS.items()
+}
+
+# Characters of context kept either side of the first match, and the length of /chat excerpts
+SNIPPET_RADIUS = 200
+CHAT_EXCERPT_LENGTH = 300
+MARK_OPEN = '<mark style="background-color: yellow; padding: 2px; border-radius: 3px;">'
+MARK_CLOSE = '</mark>'
+# Replacement for highlighted matches; \g<0> keeps the matched text's original casing
+HIGHLIGHT_TEMPLATE = MARK_OPEN + r'\g<0>' + MARK_CLOSE
+
+@lru_cache(maxsize=4096)
+def highlight_pattern(query_terms: tuple):
+    """Case-insensitive alternation of the query terms, compiled once per term set"""
+    # Longest terms first so overlapping terms highlight the longer match; \b keeps matches to
+    # whole tokens, the same units BM25 scores, so 'individual' is not marked inside 'individuals'
+    terms = sorted(query_terms, key=len, reverse=True)
+    return re.compile(r'\b(?:' + '|'.join(re.escape(term) for term in terms) + r')\b', re.IGNORECASE)
+
+def find_token(text_lower: str, term: str, start: int = 0) -> int:
+    """str.find for term as a whole token: the next match not inside a longer word (-1 if none)"""
+    position = text_lower.find(term, start)
+    while position >= 0:
+        end = position + len(term)
+        if (position == 0 or not is_word_char(text_lower[position - 1])) and \
+                (end == len(text_lower) or not is_word_char(text_lower[end])):
+            return position
+        position = text_lower.find(term, position + 1)
+    return position
+
+def highlight_ascii(text: str, query_terms: tuple, text_lower: str = None) -> str:
+    """str.find-based equivalent of the regex highlight for ASCII text and terms"""
+    # Leftmost match wins, the longest term on ties - the same spans the alternation picks
+    if text_lower is None:
+        text_lower = text.lower()
+    next_hits = {term: find_token(text_lower, term) for term in query_terms}
+    parts = []
+    position = 0
+    while True:
+        hits = [(start, -len(term), term) for term, start in next_hits.items() if start >= 0]
+        if not hits:
+            break
+        start, _, term = min(hits)
+        end = start + len(term)
+        parts += (text[position:start], MARK_OPEN, text[start:end], MARK_CLOSE)
+        position = end
+        for other, other_start in next_hits.items():
+            if 0 <= other_start < end:
+                next_hits[other] = find_token(text_lower, other, end)
+    parts.append(text[position:])
+    return ''.join(parts)
+
+def highlight(text: str, query_terms: tuple, text_lower: str = None) -> str:
+    """Wrap every whole-token query-term match in <mark>; plain str.find scans when everything is ASCII"""
+    if text.isascii() and all(term.isascii() for term in query_terms):
+        return highlight_ascii(text, query_terms, text_lower)
+    return highlight_pattern(query_terms).sub(HIGHLIGHT_TEMPLATE, text)
+
+def first_match(text: str, query_terms: tuple, text_lower: str = None) -> int:
+    """Offset of the first whole-token query-term match in text (0 if none)"""
+    if text.isascii() and all(term.isascii() for term in query_terms):
+        if text_lower is None:
+            text_lower = text.lower()
+        hits = [start for start in (find_token(text_lower, term) for term in query_terms) if start >= 0]
+        return min(hits, default=0)
+    match = highlight_pattern(query_terms).search(text)
+    return match.start() if match else 0
+
+@lru_cache(maxsize=4096)
+def highlight_snippet(doc_id: int, query_terms: tuple):
+    """Highlighted window of SNIPPET_RADIUS characters either side of the first match, plus its (start, end) in the text"""
+    # The lowercased copy from import is reused; it only lines up with the text on the ASCII path,
+    # where lowercasing keeps every offset
+    text, text_lower = TEXTS[doc_id], TEXTS_LOWER[doc_id]
+    offset = first_match(text, query_terms, text_lower)
+    # Both edges snap back to a word start: the slice edges count as word boundaries, so a word
+    # cut in half could otherwise be highlighted as a match
+    start = word_start(text, max(0, offset - SNIPPET_RADIUS))
+    end = word_start(text, min(len(text), offset + SNIPPET_RADIUS))
+    return highlight(text[start:end], query_terms, text_lower[start:end]), start, end
 
 def search_documents(query: str, top_k: int = 5) -> List[Dict]:
     """Simple text search through documents"""
-    query_lower = query.lower()
-    query_terms = [term for term in query_lower.split() if len(term) > 2]
-    
+    # Results depend only on the distinct searchable words (stop words dropped), so repeats of a query
+    # in any casing, order or punctuation share one cache entry; hand out copies so callers can't
+    # mutate the cached results
+    return [dict(result) for result in _search_cached(parse_query(query), top_k)]
+
+@lru_cache(maxsize=2048)
+def _search_cached(query_terms: tuple, top_k: int) -> tuple:
+    """Rank and highlight documents for the sorted, distinct words from parse_query()"""
     if not query_terms:
-        return []
+        return ()
     
-    results = []
+    # Queries with no indexed term (typos, probes) are answered without touching any postings
+    indexed_terms = [term for term in query_terms if term in IDF]
+    if not indexed_terms:
+        return ()
     
-    for doc in DOCUMENTS:
-        text_lower = doc['text'].lower()
-        
-        # Calculate relevance score
-        score = 0
-        matches = 0
-        
-        for term in query_terms:
-            count = text_lower.count(term)
-            if count > 0:
-                score += count * len(term) * 2
-                matches += 1
-        
-        if matches > 1:
-            score *= (1 + matches * 0.2)
-        
-        if score > 0:
-            doc_copy = doc.copy()
-            doc_copy['relevance_score'] = min(score / len(doc['text']), 1.0)
-            doc_copy['highlighted_text'] = highlight_text(doc['text'], query)
-            doc_copy['match_count'] = matches
-            results.append(doc_copy)
+    # Sum each term's precomputed BM25 contributions
+    scores = defaultdict(float)
+    matches = defaultdict(int)
+    for term in indexed_terms:
+        for doc_id, contribution in BM25_POSTINGS[term]:
+            scores[doc_id] += contribution
+            matches[doc_id] += 1
     
-    # Sort by relevance score
-    results.sort(key=lambda x: (x['relevance_score'], x['match_count']), reverse=True)
-    return results[:top_k]
-
-@app.route('/')
-def home():
-    """Home page with API documentation"""
-    base_url = request.host_url.rstrip('/')
+    # Scaled by the best score any document could reach for this query
+    max_score = sum(IDF[term] for term in indexed_terms) * (BM25_K1 + 1)
     
-    return f"""
+    # Keep the top_k by score (then match count, ties in corpus order) with a bounded heap;
+    # dicts are only built for the returned rows
+    ranked = heapq.nlargest(top_k, scores, key=lambda doc_id: (scores[doc_id], matches[doc_id], -doc_id))
+    
+    results = []
+    for doc_id in ranked:
+        result = {field: column[doc_id] for field, column in COLUMNS.items()}
+        snippet, start, end = highlight_snippet(doc_id, query_terms)
+        result['relevance_score'] = round(scores[doc_id] / max_score, 3)
+        result['highlighted_text'] = snippet
+        result['match_count'] = matches[doc_id]
+        result['snippet_start'] = start
+        result['snippet_end'] = end
+        results.append(result)
+    return tuple(results)
+
+# Home page HTML, built once; only the base URL changes per request
+HOME_TEMPLATE = '''
     <!DOCTYPE html>
     <html>
     <head>
         <title>PDF Search API</title>
         <style>
-            body {{ font-family: Arial, sans-serif; margin: 40px; background: #f5f7fa; }}
-            .container {{ max-width: 800px; margin: 0 auto; background: white; padding: 30px; border-radius: 8px; }}
-            .status {{ background: #e8f5e8; padding: 15px; border-radius: 5px; margin: 20px 0; }}
-            .endpoint {{ background: #f8f9fa; padding: 15px; margin: 10px 0; border-radius: 5px; }}
-            .method {{ color: #007acc; font-weight: bold; }}
-            a {{ color: #007acc; text-decoration: none; }}
+            body { font-family: Arial, sans-serif; margin: 40px; background: #f5f7fa; }
+            .container { max-width: 800px; margin: 0 auto; background: white; padding: 30px; border-radius: 8px; }
+            .status { background: #e8f5e8; padding: 15px; border-radius: 5px; margin: 20px 0; }
+            .endpoint { background: #f8f9fa; padding: 15px; margin: 10px 0; border-radius: 5px; }
+            .method { color: #007acc; font-weight: bold; }
+            a { color: #007acc; text-decoration: none; }
         </style>
     </head>
     <body>
@@ -162,8 +196,8 @@ def home():
             <h1>📄 PDF Search API</h1>
             <div class="status">
                 <h3>✅ Status: Online</h3>
-                <p>Documents: {len(DOCUMENTS)} available</p>
-                <p>Base URL: {base_url}</p>
+                <p>Documents: {DOC_COUNT} available</p>
+                <p>Base URL: {BASE_URL}</p>
             </div>
             
             <h2>🔌 API Endpoints</h2>
@@ -185,36 +219,57 @@ def home():
             </div>
             
             <h2>🔗 Integration URLs</h2>
-            <p><strong>Power Automate:</strong> {base_url}/search?q=[query]&max_results=5</p>
-            <p><strong>Copilot Studio:</strong> {base_url}/chat (POST)</p>
+            <p><strong>Power Automate:</strong> {BASE_URL}/search?q=[query]&max_results=5</p>
+            <p><strong>Copilot Studio:</strong> {BASE_URL}/chat (POST)</p>
         </div>
     </body>
     </html>
-    """
+    '''.replace('{DOC_COUNT}', str(DOC_COUNT))
+
+@lru_cache(maxsize=16)
+def home_html(base_url: str) -> str:
+    """Home page for one base URL (a deployment is reached through a handful of hosts)"""
+    return HOME_TEMPLATE.replace('{BASE_URL}', base_url)
+
+@app.route('/')
+def home():
+    """Home page with API documentation"""
+    return Response(home_html(request.host_url.rstrip('/')), mimetype='text/html')
+
+# Liveness payloads never change, so they are serialized once; a fresh Response is still
+# built per request because CORS adds headers to it
+HEALTH_BODY = app.json.dumps({
+    'status': 'healthy',
+    'service': 'PDF Search API',
+    'documents_count': DOC_COUNT,
+    'version': '1.0.0'
+}) + '\n'
+PING_BODY = app.json.dumps({'status': 'ok', 'service': 'pdf-search-api'}) + '\n'
 
 @app.route('/health')
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'service': 'PDF Search API',
-        'documents_count': len(DOCUMENTS),
-        'version': '1.0.0'
-    })
+    return Response(HEALTH_BODY, mimetype='application/json')
+
+@app.route('/ping')
+def ping():
+    """Minimal liveness probe"""
+    return Response(PING_BODY, mimetype='application/json')
 
 @app.route('/search', methods=['GET', 'POST'])
 def search():
     """Search endpoint"""
     try:
         if request.method == 'POST':
-            data = request.get_json()
+            # Parsed by the orjson provider; malformed bodies come back as None (a 400 below), not an exception
+            data = request.get_json(silent=True, cache=False)
             if not data:
                 return jsonify({'success': False, 'error': 'No JSON data'}), 400
             query = data.get('query', '')
-            max_results = data.get('max_results', 5)
+            max_results = parse_int(data.get('max_results'), 5, 20)
         else:
             query = request.args.get('q', '').strip()
-            max_results = int(request.args.get('max_results', 5))
+            max_results = parse_int(request.args.get('max_results'), 5, 20)
         
         if not query:
             return jsonify({'success': False, 'error': 'Query required'}), 400
@@ -236,7 +291,7 @@ def search():
 def chat():
     """Chat endpoint for Copilot Studio"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True, cache=False)
         if not data:
             return jsonify({'success': False, 'message': 'No JSON data'}), 400
         
@@ -253,12 +308,18 @@ def chat():
                 'results': []
             })
         
-        # Format response
-        response_text = f"Found {len(results)} results for '{message}':\\n\\n"
+        # Format response; excerpts are cut from the raw text before highlighting so a <mark> is never split
+        highlight_terms = parse_query(message)
+        response_parts = [f"Found {len(results)} results for '{message}':\\n\\n"]
         for i, result in enumerate(results, 1):
-            response_text += f"**{i}. {result['file_name']} (Page {result['page_number']})**\\n"
-            response_text += f"{result['highlighted_text'][:300]}...\\n"
-            response_text += f"[View Document]({result['url']})\\n\\n"
+            excerpt = result['text'][result['snippet_start']:result['snippet_end']]
+            ellipsis = '...' if len(excerpt) > CHAT_EXCERPT_LENGTH else ''
+            # Cut at a word start too, so the excerpt never ends in a highlighted word fragment
+            cut = word_start(excerpt, CHAT_EXCERPT_LENGTH) or CHAT_EXCERPT_LENGTH
+            response_parts.append(f"**{i}. {result['file_name']} (Page {result['page_number']})**\\n")
+            response_parts.append(f"{highlight(excerpt[:cut], highlight_terms)}{ellipsis}\\n")
+            response_parts.append(f"[View Document]({result['url']})\\n\\n")
+        response_text = ''.join(response_parts)
         
         return jsonify({
             'success': True,
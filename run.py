@@ -3,22 +3,21 @@
 Simple startup script for PDF Search System
 """
 
+import importlib.util
 import os
 import sys
 import subprocess
 
 def check_dependencies():
     """Check if required packages are installed"""
-    try:
-        import flask
-        import sentence_transformers
-        import faiss
-        print("✅ All dependencies are installed")
-        return True
-    except ImportError as e:
-        print(f"❌ Missing dependency: {e}")
+    # find_spec locates the packages without importing them (torch/faiss take seconds to load)
+    missing = [name for name in ('flask', 'sentence_transformers', 'faiss') if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"❌ Missing dependency: {', '.join(missing)}")
         print("Please run: pip install -r requirements.txt")
         return False
+    print("✅ All dependencies are installed")
+    return True
 
 def check_data_file():
     """Check if PDF search data exists"""
@@ -51,9 +50,19 @@ def main():
     print("💬 Chat Interface: http://localhost:5000/chat-ui")
     print("\n" + "=" * 40)
     
-    # Start the Flask app
+    # Start the Flask app: under gunicorn (gunicorn.conf.py preloads it so the search data is
+    # loaded once and shared by the workers), waitress where gunicorn can't run (Windows),
+    # or the dev server when debugging
     os.environ['FLASK_APP'] = 'app.py'
-    subprocess.run([sys.executable, 'app.py'])
+    if os.environ.get('FLASK_DEBUG'):
+        subprocess.run([sys.executable, 'app.py'])
+    elif importlib.util.find_spec('gunicorn') is not None and os.name != 'nt':
+        subprocess.run([sys.executable, '-m', 'gunicorn', 'app:app'])
+    elif importlib.util.find_spec('waitress') is not None:
+        port = os.environ.get('PORT', 5000)
+        subprocess.run([sys.executable, '-m', 'waitress', f'--listen=0.0.0.0:{port}', '--threads=8', 'app:app'])
+    else:
+        subprocess.run([sys.executable, 'app.py'])
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Shared document corpus and search logic for the Flask entrypoints
+Imported once (gunicorn preload) so the index and caches are shared by all workers
+"""
+
+import re
+import heapq
+import io
+import math
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+try:
+    import numpy as np
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# GDPR Documents with SharePoint URLs
+DOCUMENTS = [
+    {
+        'file_name': 'IC-GDPR-Compliance-Manual-Final_03_21.pdf',
+        'file_path': 'Files/IC-GDPR-Compliance-Manual-Final_03_21.pdf',
+        'page_number': 1,
+        'paragraph_index': 0,
+        'text': 'GDPR Compliance Manual Final 03_21. This comprehensive document provides detailed guidance on GDPR compliance requirements, data protection principles, individual rights under the regulation, and implementation strategies for organizations.',
+        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EeQeUyussbhPuu1rsUudHeoBiCJ0kF6n5QHxfo8D7RAh2A?e=1xN8ld'
+    },
+    {
+        'file_name': 'GDPR-Final-EPSU.pdf',
+        'file_path': 'Files/GDPR-Final-EPSU.pdf',
+        'page_number': 1,
+        'paragraph_index': 0,
+        'text': 'GDPR Final EPSU document. European Public Service Union guidance on General Data Protection Regulation implementation, covering data protection principles, employee rights, and organizational compliance measures.',
+        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EWmQegZF3d1Orxp6erD-evkB6zWDz85NJid5N3DYJf950w?e=OZgzm2'
+    },
+    {
+        'file_name': 'LW-Privacy-GDPR-Compliance-Checklist.pdf',
+        'file_path': 'Files/LW-Privacy-GDPR-Compliance-Checklist.pdf',
+        'page_number': 1,
+        'paragraph_index': 0,
+        'text': 'Privacy GDPR Compliance Checklist. A comprehensive checklist for organizations to ensure GDPR compliance, covering data protection impact assessments, consent management, data subject rights, and privacy by design principles.',
+        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/ETtl-ZcFufVIuN6VwRGCLYMB8hYh53gYIGl7ybYCIElLEg?e=KHDM9m'
+    },
+    {
+        'file_name': 'Regulation-of-European-Parliament.pdf',
+        'file_path': 'Files/Regulation of European Parliament.pdf',
+        'page_number': 1,
+        'paragraph_index': 0,
+        'text': 'Regulation of European Parliament on data protection. Official regulation text covering the protection of natural persons with regard to the processing of personal data and on the free movement of such data.',
+        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EaeQ3ZsLSaFJnq0PgMp0SDoBGKRxrWL_E4Zh21rW9wVTtw?e=k2gmIr'
+    },
+    {
+        'file_name': 'Rights-of-Individuals-under-the-General-Data-Protection-RegulationAmendedApril.pdf',
+        'file_path': 'Files/Rights-of-Individuals-under-the-General-Data-Protection-RegulationAmendedApril.pdf',
+        'page_number': 1,
+        'paragraph_index': 0,
+        'text': 'Rights of Individuals under the General Data Protection Regulation (Amended April). Detailed guide covering individual rights including access, rectification, erasure, data portability, restriction of processing, and objection to processing.',
+        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EQy-AD8NoFFFk6DeUfOi1AMBhdoZvsO0Its6LCtYtasxUA?e=4QgvMx'
+    },
+    {
+        'file_name': 'Data-Processing-Agreement-Template.pdf',
+        'file_path': 'Files/Data-Processing-Agreement-Template.pdf',
+        'page_number': 1,
+        'paragraph_index': 0,
+        'text': 'Data Processing Agreement Template for GDPR compliance. This template establishes the relationship between data controllers and data processors, defining responsibilities, security measures, breach notification procedures, and contractual safeguards.',
+        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EeQeUyussbhPuu1rsUudHeoBiCJ0kF6n5QHxfo8D7RAh2A?e=1xN8ld'
+    },
+    {
+        'file_name': 'GDPR-Consent-Requirements.pdf',
+        'file_path': 'Files/GDPR-Consent-Requirements.pdf',
+        'page_number': 1,
+        'paragraph_index': 0,
+        'text': 'GDPR Consent Requirements and best practices. Consent under GDPR must be freely given, specific, informed and unambiguous. Controllers must be able to demonstrate that consent was given, and individuals have the right to withdraw consent at any time.',
+        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EeQeUyussbhPuu1rsUudHeoBiCJ0kF6n5QHxfo8D7RAh2A?e=1xN8ld'
+    },
+    {
+        'file_name': 'Data-Protection-Principles.pdf',
+        'file_path': 'Files/Data-Protection-Principles.pdf',
+        'page_number': 1,
+        'paragraph_index': 0,
+        'text': 'Key data protection principles under GDPR including lawfulness, fairness and transparency, purpose limitation, data minimisation, accuracy, storage limitation, integrity and confidentiality, and accountability. Organizations must demonstrate compliance with these principles.',
+        'url': 'https://4ciusa.sharepoint.com/:b:/s/4ConsultingInc/EaeQ3ZsLSaFJnq0PgMp0SDoBGKRxrWL_E4Zh21rW9wVTtw?e=k2gmIr'
+    }
+]
+
+DOC_COUNT = len(DOCUMENTS)
+
+# BM25 ranking over an inverted index built once at import (Lucene defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Common words that would match nearly every document
+STOP_WORDS = frozenset({'the', 'and', 'for', 'with', 'from', 'that', 'this', 'under'})
+
+def tokenize(text):
+    """Case-folded word tokens (casefold also maps e.g. 'ß' to 'ss')"""
+    return re.findall(r'\w+', text.casefold())
+
+@lru_cache(maxsize=1024)
+def query_terms(query):
+    """Tokenize a query once into its sorted searchable words"""
+    return tuple(sorted(w for w in tokenize(query) if len(w) > 2 and w not in STOP_WORDS))
+
+POSTINGS = defaultdict(list)  # term -> [(document index, term frequency)]
+DOC_LENGTHS = []
+for doc_idx, doc in enumerate(DOCUMENTS):
+    tokens = tokenize(doc['text'])
+    DOC_LENGTHS.append(len(tokens))
+    for term, tf in Counter(tokens).items():
+        POSTINGS[term].append((doc_idx, tf))
+
+AVG_DOC_LENGTH = sum(DOC_LENGTHS) / len(DOC_LENGTHS)
+IDF = {
+    term: math.log((DOC_COUNT - len(postings) + 0.5) / (len(postings) + 0.5) + 1)
+    for term, postings in POSTINGS.items()
+}
+
+def bm25(idf, tf, doc_len):
+    """BM25 contribution of one term to one document"""
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / AVG_DOC_LENGTH)
+    return idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+# Upper bound on each term's contribution, used to skip documents that cannot reach the top k
+MAX_CONTRIBUTION = {
+    term: max(bm25(IDF[term], tf, DOC_LENGTHS[doc_idx]) for doc_idx, tf in postings)
+    for term, postings in POSTINGS.items()
+}
+
+if NUMBA_AVAILABLE:
+    # Posting lists as arrays so the scoring loop can run as compiled code
+    POSTING_ARRAYS = {
+        term: (np.array([doc_idx for doc_idx, _ in postings], dtype=np.int32),
+               np.array([tf for _, tf in postings], dtype=np.int32))
+        for term, postings in POSTINGS.items()
+    }
+    DOC_LENGTH_ARRAY = np.array(DOC_LENGTHS, dtype=np.float64)
+    
+    @njit(cache=True)
+    def bm25_scatter(doc_ids, tfs, doc_len, idf, k1, b, avgdl, admit_new, scores, matches):
+        """Add one term's BM25 contributions into scores, skipping unseen documents unless admit_new"""
+        for j in range(doc_ids.shape[0]):
+            doc_idx = doc_ids[j]
+            if not admit_new and matches[doc_idx] == 0:
+                continue
+            tf = tfs[j]
+            scores[doc_idx] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len[doc_idx] / avgdl))
+            matches[doc_idx] += 1
+    
+    # Compile at import (shared by preloaded workers) rather than on the first query
+    bm25_scatter(np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), DOC_LENGTH_ARRAY,
+                 1.0, BM25_K1, BM25_B, AVG_DOC_LENGTH, True,
+                 np.zeros(DOC_COUNT), np.zeros(DOC_COUNT, dtype=np.int32))
+
+def score_terms(terms, max_results):
+    """Accumulate BM25 scores for terms (rarest first) with MaxScore pruning"""
+    remaining = sum(MAX_CONTRIBUTION[term] for term in terms)
+    scores = defaultdict(float)
+    matches = defaultdict(int)
+    
+    for term in terms:
+        idf = IDF[term]
+        
+        # Partial scores only grow, so the current k-th best is a floor for the final k-th best;
+        # a document first seen now can score at most the remaining terms' upper bounds
+        threshold = heapq.nlargest(max_results, scores.values())[-1] if len(scores) >= max_results else 0.0
+        admit_new = remaining >= threshold
+        remaining -= MAX_CONTRIBUTION[term]
+        
+        for doc_idx, tf in POSTINGS[term]:
+            if not admit_new and doc_idx not in scores:
+                continue
+            scores[doc_idx] += bm25(idf, tf, DOC_LENGTHS[doc_idx])
+            matches[doc_idx] += 1
+    
+    return scores, matches
+
+def score_terms_numba(terms, max_results):
+    """score_terms with the per-posting loop in compiled code"""
+    remaining = sum(MAX_CONTRIBUTION[term] for term in terms)
+    scores = np.zeros(DOC_COUNT)
+    matches = np.zeros(DOC_COUNT, dtype=np.int32)
+    
+    for term in terms:
+        seen = scores[matches > 0]
+        threshold = np.partition(seen, -max_results)[-max_results] if len(seen) >= max_results else 0.0
+        admit_new = remaining >= threshold
+        remaining -= MAX_CONTRIBUTION[term]
+        
+        doc_ids, tfs = POSTING_ARRAYS[term]
+        bm25_scatter(doc_ids, tfs, DOC_LENGTH_ARRAY, IDF[term], BM25_K1, BM25_B, AVG_DOC_LENGTH,
+                     admit_new, scores, matches)
+    
+    candidates = np.flatnonzero(matches)
+    return ({int(i): float(scores[i]) for i in candidates},
+            {int(i): int(matches[i]) for i in candidates})
+
+# Yellow highlight wrapped around each matched query word
+MARK_OPEN = '<mark style="background-color: yellow; padding: 2px; border-radius: 3px;">'
+MARK_CLOSE = '</mark>'
+
+@lru_cache(maxsize=256)
+def highlight_pattern(query_words):
+    """Compile the query words into one case-insensitive alternation, longest first"""
+    words = sorted(set(query_words), key=len, reverse=True)
+    if not words:
+        return None
+    # \b limits matches to whole tokens, the units BM25 scored the document on
+    return re.compile(r'\b(?:' + '|'.join(re.escape(w) for w in words) + r')\b', re.IGNORECASE)
+
+def is_word_char(char):
+    """Whether char is a regex \\w character (letter, digit or underscore)"""
+    return char.isalnum() or char == '_'
+
+@lru_cache(maxsize=256)
+def highlight_automaton(query_words):
+    """Build an Aho-Corasick automaton over the query words"""
+    if not query_words:
+        return None
+    automaton = ahocorasick.Automaton()
+    for word in set(query_words):
+        automaton.add_word(word, len(word))
+    automaton.make_automaton()
+    return automaton
+
+def highlight_text(text, query_words):
+    """Add yellow highlighting to matching terms"""
+    text_folded = text.casefold()
+    
+    # Offsets in the folded text only line up with the original when folding kept the length
+    if not AHOCORASICK_AVAILABLE or len(text_folded) != len(text):
+        pattern = highlight_pattern(query_words)
+        if pattern is None:
+            return text
+        # Single pass over the text, keeping the original casing of each match
+        return pattern.sub(lambda m: MARK_OPEN + m.group(0) + MARK_CLOSE, text)
+    
+    automaton = highlight_automaton(query_words)
+    if automaton is None:
+        return text
+    
+    # Copy the original text through, wrapping each longest non-overlapping hit that is a whole
+    # token (no word character either side), as the regex path's \b does
+    out = io.StringIO()
+    cursor = 0
+    for end, length in automaton.iter_long(text_folded):
+        start = end + 1 - length
+        if (start > 0 and is_word_char(text_folded[start - 1])) or \
+                (end + 1 < len(text_folded) and is_word_char(text_folded[end + 1])):
+            continue
+        out.write(text[cursor:start])
+        out.write(MARK_OPEN)
+        out.write(text[start:end + 1])
+        out.write(MARK_CLOSE)
+        cursor = end + 1
+    out.write(text[cursor:])
+    return out.getvalue()
+
+def word_start(text, position):
+    """position moved back to the start of the word it falls inside (unchanged between words)"""
+    while 0 < position < len(text) and is_word_char(text[position - 1]) and is_word_char(text[position]):
+        position -= 1
+    return position
+
+def chat_excerpt(text, query_words, limit=300):
+    """First limit characters of text, highlighted, with an ellipsis if it was cut"""
+    # Cut the raw text before highlighting, so a <mark> is never split or left unclosed; the cut
+    # goes back to a word start so a word fragment is never marked as a match
+    if len(text) <= limit:
+        return highlight_text(text, query_words)
+    end = word_start(text, limit) or limit
+    return highlight_text(text[:end], query_words) + "..."
+
+def search_documents(query_words, max_results=5, highlight=True):
+    """Search through documents for the words from query_terms()"""
+    if not query_words:
+        return []
+    
+    # Hand out copies so callers can't mutate the cached results
+    return [dict(result) for result in _search_cached(query_words, max_results, highlight)]
+
+@lru_cache(maxsize=512)
+def _search_cached(query_words, max_results, highlight):
+    """Rank and highlight documents for a normalized query"""
+    if max_results <= 0:
+        return ()
+    
+    # Rarest terms first, so the strongest candidates are found before the common terms
+    terms = sorted((term for term in query_words if term in IDF), key=lambda t: len(POSTINGS[t]))
+    max_score = sum(IDF[term] for term in terms) * (BM25_K1 + 1)
+    
+    # Accumulate BM25 contributions by walking each query term's posting list
+    if NUMBA_AVAILABLE:
+        scores, matches = score_terms_numba(terms, max_results)
+    else:
+        scores, matches = score_terms(terms, max_results)
+    
+    # Sort by relevance score (ties keep corpus order)
+    ranked = heapq.nlargest(max_results, scores, key=lambda i: (scores[i], matches[i], -i))
+    
+    results = []
+    for doc_idx in ranked:
+        doc = DOCUMENTS[doc_idx]
+        result = {
+            'file_name': doc['file_name'],
+            'page_number': doc['page_number'],
+            'url': doc['url'],
+            # Scaled by the best score any document could reach for this query
+            'relevance_score': round(scores[doc_idx] / max_score, 3),
+            'match_count': matches[doc_idx]
+        }
+        # Send the body once: highlighted when requested, plain otherwise
+        if highlight:
+            result['highlighted_text'] = highlight_text(doc['text'], query_words)
+        else:
+            result['text'] = doc['text']
+        results.append(result)
+    
+    return tuple(results)
@@ -48,6 +48,12 @@ echo.
 echo Press Ctrl+C to stop the server
 echo.
 
-python app.py
+REM Serve with waitress (multi-threaded) when installed, else the Flask dev server
+python -c "import waitress" >nul 2>&1
+if %errorlevel% equ 0 (
+    python -m waitress --listen=0.0.0.0:5000 --threads=8 app:app
+) else (
+    python app.py
+)
 
 pause
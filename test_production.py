@@ -5,156 +5,384 @@ Tests the production-ready Flask API for Render deployment
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import io
 import json
+import os
+import random
+import sys
+import threading
 import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import MappingProxyType
+from urllib.parse import urlencode
 
-def test_production_api(base_url="http://localhost:5000"):
-    """Test all production API endpoints"""
-    print("🧪 Testing Production PDF Search API")
-    print("=" * 50)
-    print(f"Base URL: {base_url}")
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+LOAD_WORKERS = 32
+
+# One session for every check: urllib3 keeps the connection alive between requests,
+# so only the first one pays the TCP (and, against Render, TLS) handshake. The pool is
+# sized for the load-test workers so no thread has to open a throwaway connection.
+#
+# Transport retries: a failed connect (nothing reached the server) is retried for any method,
+# read errors only for idempotent methods - urllib3's default set, which leaves out POST
+RETRY = Retry(total=2, connect=2, read=1, status=0, backoff_factor=0.1,
+              allowed_methods=Retry.DEFAULT_ALLOWED_METHODS)
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=2 * LOAD_WORKERS, max_retries=RETRY))
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=2 * LOAD_WORKERS, max_retries=RETRY))
+
+RETRY_COUNTS = Counter()  # Idempotency-Key (POST) or 'METHOD path' -> retries spent
+RETRY_LOCK = threading.Lock()
+
+def count_retries(response, *args, **kwargs):
+    """Response hook recording how many transport retries a request needed"""
+    retries = getattr(response.raw, 'retries', None)
+    if retries is not None and retries.history:
+        request = response.request
+        key = request.headers.get('Idempotency-Key') or f"{request.method} {request.path_url}"
+        with RETRY_LOCK:
+            RETRY_COUNTS[key] += len(retries.history)
+    return response
+
+SESSION.hooks['response'].append(count_retries)
+
+BASE_URL = "http://localhost:5000"
+
+# Request parameters and bodies shared by every run (read-only)
+SEARCH_GET_PARAMS = MappingProxyType({'q': 'data protection', 'max_results': 2})
+SEARCH_POST_PAYLOAD = {'query': 'GDPR compliance', 'max_results': 2}
+CHAT_PAYLOAD = {'message': 'What are individual rights?'}
+POWER_AUTOMATE_PARAMS = MappingProxyType({'q': 'GDPR principles', 'max_results': 3})
+
+# (connect, read) timeouts per endpoint: connecting should be near-instant, while chat may
+# take a while on a cold worker
+TIMEOUTS = {
+    'health': (1.0, 2.0),
+    'search': (1.0, 5.0),
+    'chat': (1.0, 15.0),
+    'error': (1.0, 2.0),
+}
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of sending a request while the circuit breaker is open"""
+
+class CircuitBreaker:
+    """Fail fast once the server has refused several requests in a row"""
+    # CLOSED: requests go through. OPEN (after fail_threshold consecutive connection errors or
+    # timeouts): requests are rejected without being sent. HALF_OPEN (open_seconds later): one
+    # request is let through as a trial while the rest are still rejected - success closes the
+    # breaker, failure re-opens it.
+    
+    def __init__(self, fail_threshold=3, open_seconds=5.0):
+        self.fail_threshold = fail_threshold
+        self.open_seconds = open_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.half_open_in_flight = False
+        self.lock = threading.Lock()
     
-    # Test 1: Health Check
-    print("\n1️⃣ Testing Health Endpoint...")
+    def call(self, func):
+        trial = False
+        with self.lock:
+            if self.opened_at is not None:
+                if self.half_open_in_flight or time.monotonic() - self.opened_at < self.open_seconds:
+                    raise CircuitOpenError("circuit open: server failed repeatedly, not retrying yet")
+                # First caller after the window is the trial; the flag keeps the others out until it ends
+                self.half_open_in_flight = trial = True
+        
+        try:
+            result = func()
+        except (requests.ConnectionError, requests.Timeout):
+            with self.lock:
+                self.failures += 1
+                if trial or self.failures >= self.fail_threshold:
+                    self.opened_at = time.monotonic()
+                if trial:
+                    self.half_open_in_flight = False
+            raise
+        except Exception:
+            # Not a connection failure, so the trial proved nothing; the next caller gets one
+            if trial:
+                with self.lock:
+                    self.half_open_in_flight = False
+            raise
+        
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            if trial:
+                self.half_open_in_flight = False
+        return result
+
+# Guards the endpoint checks so a server that dies mid-run isn't probed by every remaining check
+BREAKER = CircuitBreaker()
+
+def send(method, url, **kwargs):
+    """Issue a request on the shared session through the circuit breaker"""
+    return BREAKER.call(lambda: SESSION.request(method, url, **kwargs))
+
+def decode_json(response):
+    """Decoded JSON body, parsed straight from the raw bytes with orjson when installed"""
+    return orjson.loads(response.content) if ORJSON_AVAILABLE else response.json()
+
+def post_json(url, payload, timeout):
+    """POST payload as a JSON body, encoded with orjson when installed"""
+    # One key per logical request, so a server can recognize a retried POST as a duplicate
+    headers = {'Idempotency-Key': uuid.uuid4().hex}
+    if ORJSON_AVAILABLE:
+        headers['Content-Type'] = 'application/json'
+        return send('POST', url, data=orjson.dumps(payload), headers=headers, timeout=timeout)
+    return send('POST', url, json=payload, headers=headers, timeout=timeout)
+
+def flush(out):
+    """Write a buffered block of report lines to stdout in one call"""
+    sys.stdout.write(out.getvalue())
+    sys.stdout.flush()
+
+def check_health(base_url, out):
+    """Test 1: health endpoint"""
+    print("\n1️⃣ Testing Health Endpoint...", file=out)
     try:
-        response = requests.get(f"{base_url}/health", timeout=10)
+        response = send('GET', f"{base_url}/health", timeout=TIMEOUTS['health'])
         if response.status_code == 200:
-            data = response.json()
-            print(f"   ✅ Health: {data['status']}")
-            print(f"   📄 Documents: {data['documents_count']}")
-            print(f"   🔧 Version: {data.get('version', 'N/A')}")
+            data = decode_json(response)
+            print(f"   ✅ Health: {data['status']}", file=out)
+            print(f"   📄 Documents: {data['documents_count']}", file=out)
+            print(f"   🔧 Version: {data.get('version', 'N/A')}", file=out)
         else:
-            print(f"   ❌ Health check failed: {response.status_code}")
+            print(f"   ❌ Health check failed: {response.status_code}", file=out)
             return False
     except Exception as e:
-        print(f"   ❌ Health check error: {e}")
+        print(f"   ❌ Health check error: {e}", file=out)
         return False
-    
-    # Test 2: Search GET (Power Automate style)
-    print("\n2️⃣ Testing Search GET Endpoint (Power Automate)...")
+    return True
+
+def check_search_get(base_url, out):
+    """Test 2: search via GET (Power Automate style)"""
+    print("\n2️⃣ Testing Search GET Endpoint (Power Automate)...", file=out)
     try:
-        params = {'q': 'data protection', 'max_results': 2}
-        response = requests.get(f"{base_url}/search", params=params, timeout=10)
+        response = send('GET', f"{base_url}/search", params=SEARCH_GET_PARAMS, timeout=TIMEOUTS['search'])
         
         if response.status_code == 200:
-            data = response.json()
-            print(f"   ✅ Search successful: {data['total_results']} results")
+            data = decode_json(response)
+            print(f"   ✅ Search successful: {data['total_results']} results", file=out)
             if data['results']:
                 first_result = data['results'][0]
-                print(f"   📄 First result: {first_result['file_name']} (Page {first_result['page_number']})")
-                print(f"   🎯 Relevance: {first_result['relevance_score']:.3f}")
+                print(f"   📄 First result: {first_result['file_name']} (Page {first_result['page_number']})", file=out)
+                print(f"   🎯 Relevance: {first_result['relevance_score']:.3f}", file=out)
         else:
-            print(f"   ❌ Search GET failed: {response.status_code}")
+            print(f"   ❌ Search GET failed: {response.status_code}", file=out)
             return False
     except Exception as e:
-        print(f"   ❌ Search GET error: {e}")
+        print(f"   ❌ Search GET error: {e}", file=out)
         return False
-    
-    # Test 3: Search POST
-    print("\n3️⃣ Testing Search POST Endpoint...")
+    return True
+
+def check_search_post(base_url, out):
+    """Test 3: search via POST"""
+    print("\n3️⃣ Testing Search POST Endpoint...", file=out)
     try:
-        data = {'query': 'GDPR compliance', 'max_results': 2}
-        response = requests.post(f"{base_url}/search", json=data, timeout=10)
+        response = post_json(f"{base_url}/search", SEARCH_POST_PAYLOAD, TIMEOUTS['search'])
         
         if response.status_code == 200:
-            result_data = response.json()
-            print(f"   ✅ POST search successful: {result_data['total_results']} results")
+            result_data = decode_json(response)
+            print(f"   ✅ POST search successful: {result_data['total_results']} results", file=out)
             if result_data['results']:
-                print(f"   📄 Contains highlighting: {'<mark' in result_data['results'][0]['highlighted_text']}")
+                has_mark = '<mark' in result_data['results'][0].get('highlighted_text', '')
+                print(f"   📄 Contains highlighting: {has_mark}", file=out)
         else:
-            print(f"   ❌ Search POST failed: {response.status_code}")
+            print(f"   ❌ Search POST failed: {response.status_code}", file=out)
             return False
     except Exception as e:
-        print(f"   ❌ Search POST error: {e}")
+        print(f"   ❌ Search POST error: {e}", file=out)
         return False
-    
-    # Test 4: Chat Endpoint (Copilot Studio style)
-    print("\n4️⃣ Testing Chat Endpoint (Copilot Studio)...")
+    return True
+
+def check_chat(base_url, out):
+    """Test 4: chat endpoint (Copilot Studio style)"""
+    print("\n4️⃣ Testing Chat Endpoint (Copilot Studio)...", file=out)
     try:
-        data = {'message': 'What are individual rights?'}
-        response = requests.post(f"{base_url}/chat", json=data, timeout=10)
+        response = post_json(f"{base_url}/chat", CHAT_PAYLOAD, TIMEOUTS['chat'])
         
         if response.status_code == 200:
-            result_data = response.json()
-            print(f"   ✅ Chat successful: {result_data['total_results']} results")
-            print(f"   💬 Response length: {len(result_data['message'])} characters")
-            print(f"   🎯 Query processed: {result_data['query']}")
+            result_data = decode_json(response)
+            print(f"   ✅ Chat successful: {result_data['total_results']} results", file=out)
+            print(f"   💬 Response length: {len(result_data['message'])} characters", file=out)
+            print(f"   🎯 Query processed: {result_data['query']}", file=out)
         else:
-            print(f"   ❌ Chat endpoint failed: {response.status_code}")
+            print(f"   ❌ Chat endpoint failed: {response.status_code}", file=out)
             return False
     except Exception as e:
-        print(f"   ❌ Chat endpoint error: {e}")
+        print(f"   ❌ Chat endpoint error: {e}", file=out)
         return False
-    
-    # Test 5: Error Handling
-    print("\n5️⃣ Testing Error Handling...")
+    return True
+
+def probe_status(method, url, **kwargs):
+    """Status code of a request whose body is never needed"""
+    # stream=True returns once the headers are in; closing skips downloading the error body
+    with send(method, url, timeout=TIMEOUTS['error'], stream=True, **kwargs) as response:
+        return response.status_code
+
+def check_errors(base_url, out):
+    """Test 5: error handling (reported, never fails the run)"""
+    print("\n5️⃣ Testing Error Handling...", file=out)
     try:
-        # Test invalid endpoint
-        response = requests.get(f"{base_url}/invalid", timeout=5)
-        if response.status_code == 404:
-            print("   ✅ 404 handling works")
-        
-        # Test empty query
-        response = requests.get(f"{base_url}/search?q=", timeout=5)
-        if response.status_code == 400:
-            print("   ✅ Empty query validation works")
-        
-        # Test invalid JSON
-        response = requests.post(f"{base_url}/chat", data="invalid json", timeout=5)
-        if response.status_code == 400:
-            print("   ✅ Invalid JSON handling works")
+        # The three probes are independent, so they are sent together
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            # Test invalid endpoint (HEAD: same status, no 404 page rendered or sent)
+            not_found = executor.submit(probe_status, 'HEAD', f"{base_url}/invalid", allow_redirects=False)
+            # Test empty query
+            empty_query = executor.submit(probe_status, 'GET', f"{base_url}/search?q=")
+            # Test invalid JSON
+            bad_json = executor.submit(probe_status, 'POST', f"{base_url}/chat", data="invalid json")
+            
+            if not_found.result() == 404:
+                print("   ✅ 404 handling works", file=out)
+            if empty_query.result() == 400:
+                print("   ✅ Empty query validation works", file=out)
+            if bad_json.result() == 400:
+                print("   ✅ Invalid JSON handling works", file=out)
             
     except Exception as e:
-        print(f"   ⚠️ Error handling test failed: {e}")
+        print(f"   ⚠️ Error handling test failed: {e}", file=out)
+    return True
+
+# Tests 2-5 don't depend on each other, only on the health check passing. Failing fast against a
+# down server needs no separate budget: a failed health check stops the run before they start,
+# and once BREAKER opens every further request is rejected without spending its timeout
+ENDPOINT_CHECKS = (check_search_get, check_search_post, check_chat, check_errors)
+
+def test_production_api(base_url=BASE_URL):
+    """Test all production API endpoints"""
+    # Each block of the report is buffered and written at once instead of line by line
+    out = io.StringIO()
+    print("🧪 Testing Production PDF Search API", file=out)
+    print("=" * 50, file=out)
+    print(f"Base URL: {base_url}", file=out)
+    healthy = check_health(base_url, out)
+    flush(out)
+    if not healthy:
+        return False
     
-    print("\n" + "=" * 50)
-    print("🎉 Production API Test Complete!")
-    print("\n📋 Summary:")
-    print("✅ Health check endpoint working")
-    print("✅ Search GET endpoint (Power Automate ready)")
-    print("✅ Search POST endpoint working")
-    print("✅ Chat endpoint (Copilot Studio ready)")
-    print("✅ Error handling implemented")
-    print("✅ Yellow highlighting functional")
-    print("✅ Citations and URLs included")
+    # Run the endpoint checks concurrently over the shared session, so the run takes about one
+    # round trip instead of four; each check buffers its lines, which are printed in test order
+    with ThreadPoolExecutor(max_workers=len(ENDPOINT_CHECKS)) as executor:
+        outputs = [io.StringIO() for _ in ENDPOINT_CHECKS]
+        futures = [executor.submit(check, base_url, out) for check, out in zip(ENDPOINT_CHECKS, outputs)]
+        passed = [future.result() for future in futures]
+    for out in outputs:
+        flush(out)
+    if not all(passed):
+        failed = [check.__name__ for check, result in zip(ENDPOINT_CHECKS, passed) if not result]
+        print(f"\n❌ Failed: {', '.join(failed)}")
+        return False
+    
+    out = io.StringIO()
+    print("\n" + "=" * 50, file=out)
+    print("🎉 Production API Test Complete!", file=out)
+    print("\n📋 Summary:", file=out)
+    print("✅ Health check endpoint working", file=out)
+    print("✅ Search GET endpoint (Power Automate ready)", file=out)
+    print("✅ Search POST endpoint working", file=out)
+    print("✅ Chat endpoint (Copilot Studio ready)", file=out)
+    print("✅ Error handling implemented", file=out)
+    print("✅ Yellow highlighting functional", file=out)
+    print("✅ Citations and URLs included", file=out)
     
-    print(f"\n🌐 Ready for deployment to Render!")
-    print(f"📖 API Documentation: {base_url}/")
+    print(f"\n🌐 Ready for deployment to Render!", file=out)
+    print(f"📖 API Documentation: {base_url}/", file=out)
+    flush(out)
     
     return True
 
 def test_power_automate_format():
     """Test the exact format needed for Power Automate"""
-    print("\n🔗 Power Automate Integration Test")
-    print("-" * 40)
+    out = io.StringIO()
+    print("\n🔗 Power Automate Integration Test", file=out)
+    print("-" * 40, file=out)
     
-    base_url = "http://localhost:5000"
+    base_url = BASE_URL
     
-    # Simulate Power Automate GET request
-    test_url = f"{base_url}/search?q=GDPR%20principles&max_results=3"
-    print(f"Test URL: {test_url}")
+    # Simulate Power Automate GET request (requests encodes the query string)
+    print(f"Test URL: {base_url}/search?{urlencode(POWER_AUTOMATE_PARAMS)}", file=out)
     
     try:
-        response = requests.get(test_url, timeout=10)
+        response = send('GET', f"{base_url}/search", params=POWER_AUTOMATE_PARAMS, timeout=TIMEOUTS['search'])
         if response.status_code == 200:
-            data = response.json()
-            print("✅ Power Automate compatible response:")
-            print(f"   - success: {data['success']}")
-            print(f"   - total_results: {data['total_results']}")
-            print(f"   - results array length: {len(data['results'])}")
+            data = decode_json(response)
+            print("✅ Power Automate compatible response:", file=out)
+            print(f"   - success: {data['success']}", file=out)
+            print(f"   - total_results: {data['total_results']}", file=out)
+            print(f"   - results array length: {len(data['results'])}", file=out)
             
             if data['results']:
                 result = data['results'][0]
-                print("   - First result structure:")
-                print(f"     * file_name: {result['file_name']}")
-                print(f"     * page_number: {result['page_number']}")
-                print(f"     * url: {result['url'][:50]}...")
-                print(f"     * highlighted_text: {'<mark' in result['highlighted_text']}")
+                has_mark = '<mark' in result.get('highlighted_text', '')
+                print("   - First result structure:", file=out)
+                print(f"     * file_name: {result['file_name']}", file=out)
+                print(f"     * page_number: {result['page_number']}", file=out)
+                print(f"     * url: {result['url'][:50]}...", file=out)
+                print(f"     * highlighted_text: {has_mark}", file=out)
         else:
-            print(f"❌ Request failed: {response.status_code}")
+            print(f"❌ Request failed: {response.status_code}", file=out)
             
     except Exception as e:
-        print(f"❌ Test failed: {e}")
+        print(f"❌ Test failed: {e}", file=out)
+    
+    flush(out)
+
+def run_load_test(base_url=BASE_URL, total=200):
+    """Repeat the search and chat checks from a thread pool and report throughput"""
+    checks = (check_search_get, check_search_post, check_chat)
+    print(f"\n⚡ Load test: {total} requests from {LOAD_WORKERS} threads")
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+        futures = {}
+        for i in range(total):
+            out = io.StringIO()
+            futures[executor.submit(checks[i % len(checks)], base_url, out)] = out
+        # Failing outputs are kept, grouped by text, so one error repeated 200 times prints once
+        failures = Counter(futures[future].getvalue() for future in as_completed(futures) if not future.result())
+    elapsed = time.perf_counter() - start
+    
+    passed = total - sum(failures.values())
+    print(f"   {'✅' if passed == total else '❌'} {passed}/{total} passed in {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+    for output, count in failures.most_common():
+        print(f"\n   ❌ {count} failed with:", end="")
+        sys.stdout.write(output)
+    sys.stdout.flush()
+    return passed == total
+
+def wait_ready(url, max_attempts=8, base=0.25, cap=5.0):
+    """Poll url until it answers 200, backing off exponentially (with jitter) between attempts"""
+    for attempt in range(max_attempts):
+        try:
+            response = SESSION.get(url, timeout=TIMEOUTS['health'])
+            if response.status_code == 200:
+                return True
+            if 400 <= response.status_code < 500:
+                # A client error won't go away by retrying
+                print(f"   Health check returned {response.status_code}")
+                return False
+        except (requests.ConnectionError, requests.Timeout):
+            pass  # still starting up (e.g. gunicorn loading the indices)
+        
+        if attempt < max_attempts - 1:
+            # 0.25s, 0.5s, 1s, ... capped at 5s, stretched by up to 50% so pollers don't sync up
+            delay = min(cap, base * 2 ** attempt) * (1 + random.uniform(0, 0.5))
+            print(f"   Attempt {attempt + 1}/{max_attempts} failed, retrying in {delay:.1f}s...")
+            time.sleep(delay)
+    return False
 
 def main():
     print("🚀 PDF Search API - Production Testing")
@@ -162,34 +390,36 @@ def main():
     
     # Wait for server to be ready
     print("⏳ Checking if server is ready...")
-    for attempt in range(3):
-        try:
-            response = requests.get("http://localhost:5000/health", timeout=2)
-            if response.status_code == 200:
-                print("✅ Server is ready!")
-                break
-        except:
-            if attempt < 2:
-                print(f"   Attempt {attempt + 1}/3 failed, retrying...")
-                time.sleep(2)
-            else:
-                print("❌ Server not responding. Please start the Flask app first:")
-                print("   python render_app.py")
-                return
+    if not wait_ready(f"{BASE_URL}/health"):
+        print("❌ Server not responding. Please start the Flask app first:")
+        print("   python render_app.py")
+        return
+    print("✅ Server is ready!")
     
-    # Run tests
-    success = test_production_api()
-    
-    if success:
-        test_power_automate_format()
-        print("\n🎯 Next Steps:")
-        print("1. Push code to GitHub repository")
-        print("2. Deploy to Render using the deployment guide")
-        print("3. Test your public URL")
-        print("4. Configure Power Automate with your public URL")
-        print("5. Set up Copilot Studio integration")
-    else:
-        print("\n❌ Some tests failed. Please check the API implementation.")
+    # Run tests (LOAD=1 runs the concurrent load test instead)
+    try:
+        if os.environ.get('LOAD') == '1':
+            run_load_test(total=int(os.environ.get('LOAD_REQUESTS', 200)))
+            return
+        
+        success = test_production_api()
+        
+        if success:
+            test_power_automate_format()
+            out = io.StringIO()
+            print("\n🎯 Next Steps:", file=out)
+            print("1. Push code to GitHub repository", file=out)
+            print("2. Deploy to Render using the deployment guide", file=out)
+            print("3. Test your public URL", file=out)
+            print("4. Configure Power Automate with your public URL", file=out)
+            print("5. Set up Copilot Studio integration", file=out)
+            flush(out)
+        else:
+            print("\n❌ Some tests failed. Please check the API implementation.")
+    finally:
+        if RETRY_COUNTS:
+            print(f"\n🔁 Retries: {sum(RETRY_COUNTS.values())} across {len(RETRY_COUNTS)} requests")
+        SESSION.close()
 
 if __name__ == "__main__":
     main()